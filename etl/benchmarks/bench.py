@@ -0,0 +1,244 @@
+"""
+BENCHMARKS DEL PIPELINE
+Genera datos sintéticos a varias escalas y mide cada etapa por separado
+(limpiar_datos, calcular_kpis y la carga a PostgreSQL)
+Cada etapa corre en su propio proceso, con ETL_DATA_DIR apuntando a los datos
+de la escala, así el pico de memoria (RSS) es el de esa etapa sola
+Los resultados se acumulan en benchmarks/resultados.json, uno por revisión de
+git, para comparar commits:
+
+    python -m benchmarks.bench --escalas 1k,100k
+    python -m benchmarks.bench --comparar abc1234 def5678
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(__file__).resolve().parent
+DATOS_DIR = BENCH_DIR / 'datos'
+RESULTADOS = BENCH_DIR / 'resultados.json'
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', 'iadb_bench')
+
+
+def escala(paises: int, años: tuple[int, int] = (2010, 2023), areas: tuple[str, ...] = ('Total',),
+           sexos: tuple[str, ...] = ('Total', 'men', 'women'), indicadores: int = 10) -> dict:
+    """Parámetros de generar_datos_ejemplo; `filas` es el tamaño de la grilla país × año × área × sexo"""
+    return {
+        'filas': paises * (años[1] - años[0] + 1) * len(areas) * len(sexos),
+        'indicadores': indicadores,
+        'datos': {'n_paises': paises, 'años': años, 'areas': areas, 'sexos': sexos,
+                  'n_indicadores': indicadores, 'filas_por_chunk': 1_000_000},
+    }
+
+# Puntos de escala: filas por indicador (≈ filas de unified_data) e indicadores
+ESCALAS = {
+    '1k': escala(24),
+    '1k-200ind': escala(24, indicadores=200),
+    '100k': escala(2381),
+    '100k-200ind': escala(2381, indicadores=200),
+    '10M': escala(79366, areas=('Total', 'urban', 'rural')),
+}
+
+ETAPAS = ['transform', 'analytics', 'load']
+
+# Filas que definen el throughput de cada etapa (contadores de src/metricas.py)
+FILAS_ETAPA = {'generar': 'filas_salida', 'transform': 'filas_entrada',
+               'analytics': 'filas_entrada', 'load': 'filas_salida'}
+
+
+def revision() -> str:
+    """Commit actual (con '-sucio' si hay cambios sin commitear en el código del ETL)"""
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        sucio = subprocess.run(['git', 'status', '--porcelain', '--', 'src', 'config.py'], cwd=BASE_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'sin-git'
+    return f"{rev}-sucio" if sucio else rev
+
+
+def crear_base_bench():
+    """Crea la base de los benchmarks si no existe (nunca se carga sobre DB_NAME)"""
+    from sqlalchemy import create_engine, text
+    from config import DB_HOST, DB_PASSWORD, DB_PORT, DB_USER
+    engine = create_engine(f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/postgres",
+                           isolation_level='AUTOCOMMIT')
+    with engine.connect() as conn:
+        existe = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :n"), {'n': BENCH_DB_NAME}).scalar()
+        if not existe:
+            # UTF8 explícito: los nombres de tabla llevan ñ (kpi_pais_año)
+            conn.execute(text(f'CREATE DATABASE "{BENCH_DB_NAME}" ENCODING \'UTF8\' TEMPLATE template0'))
+    engine.dispose()
+
+
+def ejecutar_etapa(etapa: str, nombre_escala: str) -> dict:
+    """Corre una etapa en este proceso (ETL_DATA_DIR y DB_NAME ya vienen en el entorno)"""
+    from src import metricas
+    if etapa == 'generar':
+        from src.extract.extract import generar_datos_ejemplo
+        funcion = lambda: generar_datos_ejemplo(**ESCALAS[nombre_escala]['datos'])
+    elif etapa == 'transform':
+        from src.transform.transform import limpiar_datos
+        funcion = limpiar_datos
+    elif etapa == 'analytics':
+        from src.analyze.analytics import calcular_kpis
+        funcion = lambda: calcular_kpis(incremental=False)
+    elif etapa == 'load':
+        from src.load.load import cargar_a_postgres
+        crear_base_bench()
+        funcion = lambda: cargar_a_postgres(incremental=False)
+    else:
+        raise ValueError(f"Etapa desconocida: {etapa}")
+
+    metricas.reiniciar()
+    inicio = time.perf_counter()
+    with metricas.span(etapa):
+        funcion()
+    segundos = time.perf_counter() - inicio
+    reporte = metricas.reporte()
+    filas = reporte['totales'][FILAS_ETAPA[etapa]]
+    resultado = {
+        'segundos': round(segundos, 3),
+        'filas': filas,
+        'filas_por_s': round(filas / max(segundos, 1e-9)),
+        'rss_max_mb': reporte['rss_max_mb'],
+        **{clave: reporte['totales'][clave] for clave in ('bytes_leidos', 'bytes_escritos')},
+    }
+    if 'conectar' in reporte['por_nombre']:
+        resultado['conectar_s'] = reporte['por_nombre']['conectar']['segundos']
+    return resultado
+
+
+def correr_subproceso(etapa: str, nombre_escala: str, detalle: bool = False) -> dict:
+    entorno = dict(os.environ, ETL_DATA_DIR=str(DATOS_DIR / nombre_escala), DB_NAME=BENCH_DB_NAME)
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+        salida = Path(tmp.name)
+    try:
+        proceso = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench', '--etapa', etapa, '--escala', nombre_escala,
+             '--salida', str(salida)],
+            cwd=BASE_DIR, env=entorno, text=True,
+            stdout=None if detalle else subprocess.DEVNULL,
+            stderr=None if detalle else subprocess.PIPE)
+        if proceso.returncode != 0:
+            raise RuntimeError(f"La etapa '{etapa}' ({nombre_escala}) falló:\n{proceso.stderr or ''}")
+        return json.loads(salida.read_text())
+    finally:
+        salida.unlink(missing_ok=True)
+
+
+def preparar_datos(nombre_escala: str, detalle: bool = False):
+    """Genera los datos de la escala, salvo que ya existan con los mismos parámetros"""
+    marca = DATOS_DIR / nombre_escala / '_escala.json'
+    parametros = json.dumps(ESCALAS[nombre_escala]['datos'], default=list, sort_keys=True)
+    if marca.exists() and marca.read_text() == parametros:
+        print(f"  = Datos de '{nombre_escala}' ya generados")
+        return None
+    resultado = correr_subproceso('generar', nombre_escala, detalle)
+    marca.write_text(parametros)
+    print(f"  ✓ Datos de '{nombre_escala}': {resultado['filas']:,} filas en {resultado['segundos']:.2f}s")
+    return resultado
+
+
+def leer_resultados(ruta: Path) -> dict:
+    try:
+        return json.loads(ruta.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def benchmark(escalas: list[str], etapas: list[str], repeticiones: int = 1,
+              ruta: Path = RESULTADOS, detalle: bool = False) -> dict:
+    """Mide cada etapa en cada escala; de las repeticiones se guarda la más rápida"""
+    rev = revision()
+    corrida = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'maquina': f"{platform.machine()} {os.cpu_count()} CPUs",
+        'escalas': {},
+    }
+    print(f"Benchmark de {rev}: escalas {escalas}, etapas {etapas}, {repeticiones} repeticiones")
+    for nombre_escala in escalas:
+        print(f"\nEscala '{nombre_escala}' ({ESCALAS[nombre_escala]['filas']:,} filas × "
+              f"{ESCALAS[nombre_escala]['indicadores']} indicadores)")
+        preparar_datos(nombre_escala, detalle)
+        resultados = {}
+        for etapa in etapas:
+            medidas = [correr_subproceso(etapa, nombre_escala, detalle) for _ in range(repeticiones)]
+            mejor = min(medidas, key=lambda m: m['segundos'])
+            mejor['rss_max_mb'] = max(m['rss_max_mb'] for m in medidas)
+            resultados[etapa] = mejor
+            print(f"  ✓ {etapa}: {mejor['segundos']:.2f}s, {mejor['filas_por_s']:,} filas/s, "
+                  f"{mejor['rss_max_mb']:.0f} MB")
+        corrida['escalas'][nombre_escala] = {
+            'filas': ESCALAS[nombre_escala]['filas'],
+            'indicadores': ESCALAS[nombre_escala]['indicadores'],
+            'etapas': resultados,
+        }
+
+    # Se acumula por revisión: una nueva corrida de la misma revisión reemplaza solo sus escalas
+    todos = leer_resultados(ruta)
+    anterior = todos.get(rev, {}).get('escalas', {})
+    corrida['escalas'] = {**anterior, **corrida['escalas']}
+    todos[rev] = corrida
+    ruta.write_text(json.dumps(todos, indent=2, ensure_ascii=False))
+    print(f"\nResultados guardados en {ruta} (revisión {rev})")
+    return corrida
+
+
+def comparar(base: str, nueva: str, ruta: Path = RESULTADOS):
+    """Tiempo y memoria de cada etapa de `nueva` relativos a `base`"""
+    todos = leer_resultados(ruta)
+    for rev in (base, nueva):
+        if rev not in todos:
+            raise SystemExit(f"No hay resultados de '{rev}' en {ruta}. Disponibles: {list(todos)}")
+    print(f"{'escala':<14}{'etapa':<11}{base:>16}{nueva:>16}{'tiempo':>9}{'memoria':>9}")
+    for nombre_escala, datos in todos[nueva]['escalas'].items():
+        previas = todos[base]['escalas'].get(nombre_escala, {}).get('etapas', {})
+        for etapa, medida in datos['etapas'].items():
+            if etapa not in previas:
+                continue
+            previa = previas[etapa]
+            print(f"{nombre_escala:<14}{etapa:<11}{previa['segundos']:>15.2f}s{medida['segundos']:>15.2f}s"
+                  f"{medida['segundos'] / max(previa['segundos'], 1e-9):>8.2f}x"
+                  f"{medida['rss_max_mb'] / max(previa['rss_max_mb'], 1e-9):>8.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks por etapa del pipeline ETL")
+    lista = lambda s: [n.strip() for n in s.split(',') if n.strip()]
+    parser.add_argument('--escalas', type=lista, default=['1k', '100k'],
+                        help=f"Puntos de escala separados por comas: {', '.join(ESCALAS)}")
+    parser.add_argument('--etapas', type=lista, default=ETAPAS,
+                        help=f"Etapas a medir: {', '.join(ETAPAS)}")
+    parser.add_argument('--sin-carga', action='store_true', help="No medir la carga (sin PostgreSQL)")
+    parser.add_argument('--repeticiones', type=int, default=1)
+    parser.add_argument('--resultados', type=Path, default=RESULTADOS)
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NUEVA'),
+                        help="Comparar dos revisiones ya medidas")
+    parser.add_argument('--detalle', action='store_true', help="Mostrar la salida de cada etapa")
+    # Modo interno: una etapa en este proceso
+    parser.add_argument('--etapa', help=argparse.SUPPRESS)
+    parser.add_argument('--escala', help=argparse.SUPPRESS)
+    parser.add_argument('--salida', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.etapa:
+        args.salida.write_text(json.dumps(ejecutar_etapa(args.etapa, args.escala)))
+    elif args.comparar:
+        comparar(*args.comparar, ruta=args.resultados)
+    else:
+        desconocidas = [e for e in args.escalas if e not in ESCALAS] + [e for e in args.etapas if e not in ETAPAS]
+        if desconocidas:
+            raise SystemExit(f"Escalas o etapas desconocidas: {desconocidas}")
+        etapas = [e for e in args.etapas if not (args.sin_carga and e == 'load')]
+        benchmark(args.escalas, etapas, args.repeticiones, args.resultados, args.detalle)
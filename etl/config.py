@@ -1,35 +1,18 @@
 """
 Configuración del proyecto
+Importar este módulo no toca el disco: los valores que dependen del entorno
+(.env y variables) se leen una sola vez, la primera vez que se piden, en el
+objeto Configuracion que devuelve obtener_config()
+`from config import RAW_DIR` sigue funcionando: los nombres en mayúsculas
+que no son constantes se resuelven contra ese objeto
 """
 import os
+from dataclasses import dataclass
+from functools import cache
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Cargar .env
-load_dotenv()
-
-# Directorios
 BASE_DIR = Path(__file__).parent
-DATA_DIR = BASE_DIR / 'data'
-RAW_DIR = DATA_DIR / 'raw'
-PROCESSED_DIR = DATA_DIR / 'processed'
-ANALYTICS_DIR = DATA_DIR / 'analytics'
-
-# Crear directorios si no existen
-for dir_path in [RAW_DIR, PROCESSED_DIR, ANALYTICS_DIR]:
-    dir_path.mkdir(parents=True, exist_ok=True)
-
-# PostgreSQL
-DB_HOST = os.getenv('DB_HOST', '172.20.0.3')
-DB_PORT = os.getenv('DB_PORT', '5432')
-DB_NAME = os.getenv('DB_NAME', 'iadb_data')
-DB_USER = os.getenv('DB_USER', 'postgres')
-DB_PASSWORD = os.getenv('DB_PASSWORD', 'postgres')
-
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-
-# API del IADB
-IADB_API_URL = "https://data.iadb.org/api/3/action"
+
 IADB_PACKAGE_ID = "social-indicators-of-latin-america-and-the-caribbean"
 
 # Países a procesar
@@ -70,6 +53,154 @@ YEARS = [
 
 FIELDS = ['year', 'isoalpha3', 'area', 'value', 'sex']
 
-print("✓ Configuración cargada")
-print(f"  Base de datos: {DB_NAME} @ {DB_HOST}")
-print(f"  Directorios creados en: {DATA_DIR}")
\ No newline at end of file
+
+@dataclass(frozen=True)
+class Configuracion:
+    # Directorios
+    data_dir: Path
+    raw_dir: Path
+    processed_dir: Path
+    analytics_dir: Path
+
+    # Formato de los archivos entre etapas (parquet | csv)
+    storage_format: str
+    storage_compression: str
+    export_csv: bool               # copia .csv adicional (Power BI)
+    storage_sink_workers: int      # escrituras en segundo plano (modo en memoria)
+
+    # Extracción incremental: manifiesto de años/países ya descargados por recurso
+    extract_incremental: bool
+    extract_manifest: Path
+
+    # KPIs incrementales: estado agregado (suma/conteo por país y año) y hash por año de unified_data
+    analytics_incremental: bool
+    analytics_state: Path
+
+    # Caché HTTP de la API (respuestas en disco, revalidación con ETag/Last-Modified)
+    http_cache_dir: Path
+    http_cache_ttl: float          # segundos sin revalidar (0 = revalidar siempre)
+    offline: bool                  # servir solo desde caché, sin red
+
+    # PostgreSQL
+    db_host: str
+    db_port: str
+    db_name: str
+    db_user: str
+    db_password: str
+    database_url: str
+    db_wait_timeout: float         # segundos máximos esperando a que la base acepte conexiones
+    load_copy_chunk: int           # filas por bloque de COPY
+    load_max_workers: int          # tablas cargadas en paralelo
+    load_incremental: bool         # upsert solo de las particiones cambiadas
+    load_partitioned: bool         # tablas por año particionadas por rango de year
+
+    # API del IADB
+    iadb_api_url: str
+
+    # Extracción concurrente
+    extract_max_workers: int       # descargas simultáneas
+    extract_rate_limit: float      # peticiones por segundo por host (0 = sin límite)
+    http_timeout: float            # segundos
+    extract_page_size: int         # registros por página de datastore_search
+
+    # Planificador del pipeline (run_all.py): tareas en paralelo y checkpoint para reanudar
+    pipeline_max_workers: int
+    pipeline_checkpoint: Path
+    pipeline_huellas: Path         # huellas de las tareas exitosas (se saltan si no cambian)
+    metricas_dir: Path             # reportes JSON de cada corrida y perfiles
+
+    # Transform y analytics por fragmentos de países en un pool de procesos (0 = en un solo proceso)
+    shard_workers: int
+
+    # Servicio de consultas de KPIs (src/servicio): caché LRU invalidada por la generación de la última carga
+    consultas_host: str
+    consultas_port: int
+    consultas_cache: int           # resultados en caché
+    consultas_ttl: float           # segundos entre consultas de la generación (0 = en cada lectura)
+    consultas_pool: int            # conexiones del pool
+
+
+def _bandera(nombre: str) -> bool:
+    return os.getenv(nombre, '0') == '1'
+
+
+@cache
+def obtener_config() -> Configuracion:
+    """Lee .env y las variables de entorno (una sola vez por proceso)"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    data_dir = Path(os.getenv('ETL_DATA_DIR', BASE_DIR / 'data'))   # otro directorio para pruebas o benchmarks
+    raw_dir = data_dir / 'raw'
+    analytics_dir = data_dir / 'analytics'
+    db = {
+        'db_host': os.getenv('DB_HOST', '172.20.0.3'),
+        'db_port': os.getenv('DB_PORT', '5432'),
+        'db_name': os.getenv('DB_NAME', 'iadb_data'),
+        'db_user': os.getenv('DB_USER', 'postgres'),
+        'db_password': os.getenv('DB_PASSWORD', 'postgres'),
+    }
+    return Configuracion(
+        data_dir=data_dir,
+        raw_dir=raw_dir,
+        processed_dir=data_dir / 'processed',
+        analytics_dir=analytics_dir,
+        storage_format=os.getenv('STORAGE_FORMAT', 'parquet'),
+        storage_compression=os.getenv('STORAGE_COMPRESSION', 'zstd'),
+        export_csv=_bandera('EXPORT_CSV'),
+        storage_sink_workers=int(os.getenv('STORAGE_SINK_WORKERS', '2')),
+        extract_incremental=_bandera('EXTRACT_INCREMENTAL'),
+        extract_manifest=raw_dir / '_manifest.json',
+        analytics_incremental=_bandera('ANALYTICS_INCREMENTAL'),
+        analytics_state=analytics_dir / '_estado_kpis.json',
+        http_cache_dir=data_dir / 'cache' / 'http',
+        http_cache_ttl=float(os.getenv('HTTP_CACHE_TTL', '86400')),
+        offline=_bandera('ETL_OFFLINE'),
+        **db,
+        database_url=f"postgresql://{db['db_user']}:{db['db_password']}@{db['db_host']}:{db['db_port']}/{db['db_name']}",
+        db_wait_timeout=float(os.getenv('DB_WAIT_TIMEOUT', '60')),
+        load_copy_chunk=int(os.getenv('LOAD_COPY_CHUNK', '100000')),
+        load_max_workers=int(os.getenv('LOAD_MAX_WORKERS', '4')),
+        load_incremental=_bandera('LOAD_INCREMENTAL'),
+        load_partitioned=_bandera('LOAD_PARTITIONED'),
+        iadb_api_url=os.getenv('IADB_API_URL', "https://data.iadb.org/api/3/action"),
+        extract_max_workers=int(os.getenv('EXTRACT_MAX_WORKERS', '4')),
+        extract_rate_limit=float(os.getenv('EXTRACT_RATE_LIMIT', '4')),
+        http_timeout=float(os.getenv('HTTP_TIMEOUT', '60')),
+        extract_page_size=int(os.getenv('EXTRACT_PAGE_SIZE', '10000')),
+        pipeline_max_workers=int(os.getenv('PIPELINE_MAX_WORKERS', '4')),
+        pipeline_checkpoint=data_dir / '_checkpoint.json',
+        pipeline_huellas=data_dir / '_huellas.json',
+        metricas_dir=data_dir / 'metricas',
+        shard_workers=int(os.getenv('SHARD_WORKERS', '0')),
+        consultas_host=os.getenv('CONSULTAS_HOST', '127.0.0.1'),
+        consultas_port=int(os.getenv('CONSULTAS_PORT', '8000')),
+        consultas_cache=int(os.getenv('CONSULTAS_CACHE', '512')),
+        consultas_ttl=float(os.getenv('CONSULTAS_TTL', '5')),
+        consultas_pool=int(os.getenv('CONSULTAS_POOL', '4')),
+    )
+
+
+# Nombres históricos que no siguen el patrón NOMBRE -> campo nombre
+_ALIAS = {'OFFLINE': 'offline'}
+
+
+def __getattr__(nombre: str):
+    """`config.RAW_DIR` / `from config import RAW_DIR` -> obtener_config().raw_dir"""
+    campo = _ALIAS.get(nombre, nombre.lower())
+    if nombre.isupper() and campo in Configuracion.__dataclass_fields__:
+        return getattr(obtener_config(), campo)
+    raise AttributeError(f"module 'config' has no attribute '{nombre}'")
+
+
+def crear_directorios():
+    cfg = obtener_config()
+    for dir_path in [cfg.raw_dir, cfg.processed_dir, cfg.analytics_dir]:
+        dir_path.mkdir(parents=True, exist_ok=True)
+
+
+def mostrar_config():
+    cfg = obtener_config()
+    print("✓ Configuración cargada")
+    print(f"  Base de datos: {cfg.db_name} @ {cfg.db_host}")
+    print(f"  Directorios en: {cfg.data_dir}")
@@ -1,48 +1,254 @@
 """
 EJECUTAR TODO EL PIPELINE
-Ejecuta todos los pasos en orden
+Por defecto como grafo de tareas (src/planificador.py): una descarga por
+recurso, un cálculo por KPI y una carga por tabla, cada una apenas terminan
+sus dependencias, y se saltan las que no cambiaron (--force para ejecutarlas
+igual); con --en-memoria, los pasos en orden
 """
 from datetime import datetime
+import argparse
 import importlib
 import sys
 
-def run_pipeline():
-    """Ejecuta el pipeline completo ETL"""
+# Código del que dependen las tareas de analytics (va en sus huellas)
+MODULOS_ANALYTICS = ['src.analyze.analytics', 'src.analyze.kpis', 'src.storage', 'src.esquema',
+                     'src.fragmentos']
+
+def construir_tareas(plan, cliente, solo: list[str] | None = None):
+    """
+    Declara las tareas del pipeline en `plan`; devuelve la limpieza a llamar si
+    la ejecución falla (borra las tablas staging de la carga)
+    Entre etapas los datos pasan por disco (data/raw, data/processed, data/analytics),
+    así una tarea anotada en el checkpoint o saltada por huella no necesita su
+    resultado en memoria
+    """
+    import config
+    from src import huellas, planificador, storage
+    from src.analyze import kpis
+    from src.extract import extract
+    from src.extract import manifiesto as manifiesto_mod
+    # Las etapas pesadas (transform, analytics, load) se importan dentro de sus
+    # tareas, solo si alguna se ejecuta; las huellas leen su código sin importarlas
+    def transform():
+        return importlib.import_module('src.transform.transform')
+    def analytics():
+        return importlib.import_module('src.analyze.analytics')
+    def load():
+        return importlib.import_module('src.load.load')
+
+    nombres_kpi = kpis.validar_kpis(solo)
+
+    # Configuración que cambia el contenido de las salidas (va en las huellas)
+    valores = {nombre: getattr(config, nombre) for nombre in
+               ('COUNTRIES', 'YEARS', 'ALLOWED_NAMES', 'COUNTRIES_MAP', 'STORAGE_FORMAT', 'EXPORT_CSV')}
+    unified = storage.ruta_tabla(config.PROCESSED_DIR, 'unified_data')
+    def ruta_kpi(nombre):
+        return storage.ruta_tabla(config.ANALYTICS_DIR, kpis.KPIS[nombre]['tabla'])
+
+    # Recursos compartidos: se crean solo si alguna tarea que los usa no se salta
+    def conectar():
+        engine = load().conectar()
+        estado_bd = load().leer_estado_bd(engine) if config.LOAD_INCREMENTAL else None
+        return engine, estado_bd
+    conexion = planificador.Perezoso(conectar)
+    evaluador = planificador.Perezoso(lambda: analytics().preparar_kpis())
+
+    # Extracción: una tarea por recurso; si alguna falla (o la API no responde)
+    # se generan datos de ejemplo en su lugar, como en extraer_datos_iadb
+    try:
+        print("\nIntentando conectar a IADB API...")
+        recursos = extract.listar_recursos(cliente)
+    except Exception as e:
+        print(f"\nNo se pudo conectar a IADB API: {e}")
+        recursos = []
+    manifiesto = manifiesto_mod.Manifiesto()
+    def extraer(recurso):
+        def tarea(_):
+            try:
+                return extract.extraer_recurso(recurso, cliente, manifiesto, config.EXTRACT_INCREMENTAL)[0]
+            except Exception as e:
+                print(f"  ⚠ {extract.nombre_archivo(recurso)}: {e}")
+                return False
+        return tarea
+    extracciones = [plan.agregar(f"extract:{extract.nombre_archivo(r)}", extraer(r)) for r in recursos]
+    def ejemplo(entradas):
+        if recursos and all(r is not False for r in entradas.values()):
+            return
+        print("  Generando datos de ejemplo en su lugar...\n")
+        extract.generar_datos_ejemplo()
+    plan.agregar('extract:ejemplo', ejemplo, depende=extracciones)
+
+    def limpiar(_):
+        transform().limpiar_datos()
+    plan.agregar('transform', limpiar, depende=['extract:ejemplo'],
+                 huella=lambda: huellas.huella(
+                     [storage.ruta_tabla(config.RAW_DIR, t) for t in storage.listar_tablas(config.RAW_DIR)],
+                     ['src.transform.transform', 'src.storage', 'src.esquema', 'src.fragmentos'],
+                     valores),
+                 salidas=lambda: [unified])
+
+    # Analytics: el evaluador comparte los intermedios entre los KPIs
+    for nombre in nombres_kpi:
+        plan.agregar(f"analytics:{nombre}",
+                     lambda _, nombre=nombre: analytics().calcular_kpi(evaluador(), nombre) is not None,
+                     depende=['transform'],
+                     huella=lambda nombre=nombre: huellas.huella(
+                         [unified], MODULOS_ANALYTICS, {**valores, 'kpi': kpis.KPIS[nombre]}),
+                     salidas=lambda nombre=nombre: [ruta_kpi(nombre)])
+    def guardar_estado(entradas):
+        # Las tareas restauradas o saltadas traen None: cuentan si su archivo existe
+        calculados = [n for n in nombres_kpi if entradas[f"analytics:{n}"]
+                      or (entradas[f"analytics:{n}"] is None and ruta_kpi(n).exists())]
+        analytics().guardar_estado_kpis(evaluador(), calculados)
+    plan.agregar('analytics:estado', guardar_estado,
+                 depende=[f"analytics:{n}" for n in nombres_kpi],
+                 huella=lambda: huellas.huella([unified] + [ruta_kpi(n) for n in nombres_kpi],
+                                               MODULOS_ANALYTICS, {**valores, 'kpis': nombres_kpi}),
+                 salidas=lambda: [config.ANALYTICS_STATE])
+
+    # Carga: una tarea por tabla (en staging o incremental); el swap va al final
+    # Los KPIs que no se recalculan se cargan desde sus archivos existentes
+    # Sin checkpoint: lo cargado en staging no sobrevive a la corrida
+    valores_bd = {**valores, 'DATABASE_URL': config.DATABASE_URL, 'LOAD_PARTITIONED': config.LOAD_PARTITIONED}
+    def cargar(nombre, calculo=None):
+        def tarea(entradas):
+            if calculo is not None and entradas[calculo] is False:
+                return None
+            engine, estado_bd = conexion()
+            return load().cargar_tabla(engine, nombre, estado_bd=estado_bd)
+        return tarea
+    def huella_carga(ruta):
+        return lambda: huellas.huella([ruta], ['src.load.load', 'src.load.vistas', 'src.storage', 'src.esquema'],
+                                        valores_bd)
+    # Lo publicado en PostgreSQL (tabla y hashes de sus particiones): si alguien
+    # borró o cambió la tabla, la carga se ejecuta aunque la huella no cambió
+    def estado_carga(tabla):
+        return lambda: load().estado_tabla(conexion()[0], tabla)
+    cargas = [plan.agregar('load:unified_data', cargar('unified_data'), depende=['transform'],
+                           checkpoint=False, huella=huella_carga(unified), estado=estado_carga('unified_data'))]
+    tablas_kpi = {kpis.KPIS[n]['tabla']: n for n in nombres_kpi}
+    for tabla in storage.listar_tablas(config.ANALYTICS_DIR, prefijo='kpi_'):
+        tablas_kpi.setdefault(tabla, None)
+    for tabla, nombre in tablas_kpi.items():
+        calculo = f"analytics:{nombre}" if nombre is not None else None
+        cargas.append(plan.agregar(f"load:{tabla}", cargar(tabla, calculo),
+                                   depende=[calculo] if calculo else [], checkpoint=False,
+                                   huella=huella_carga(storage.ruta_tabla(config.ANALYTICS_DIR, tabla)),
+                                   estado=estado_carga(tabla)))
+
+    def publicar(entradas):
+        resultados = {t.split(':', 1)[1]: r for t, r in entradas.items() if r is not None}
+        if not resultados:
+            print("  = Ninguna tabla cambió, no hay nada que publicar")
+            return
+        engine, _ = conexion()
+        load().publicar(engine, resultados)
+        load().verificar(engine, [t for t in resultados if t != 'unified_data'])
+    plan.agregar('load:publicar', publicar, depende=cargas)
+
+    # Si falla una carga o la publicación, las staging que ya dejaron las demás
+    # cargas (copias completas de los datos) se borran, como en cargar_a_postgres
+    def descartar():
+        if not conexion.listo:
+            return
+        try:
+            load().descartar_staging(conexion()[0], ['unified_data'] + list(tablas_kpi))
+        except Exception as e:
+            print(f"  ⚠ No se pudieron borrar las tablas staging: {e}")
+    return descartar
+
+def run_pipeline(en_memoria: bool = False, solo: list[str] | None = None, reanudar: bool = False,
+                 forzar: bool = False, perfil: str | None = None):
+    """
+    Ejecuta el pipeline completo ETL
+    Con `en_memoria` cada paso recibe los DataFrames del anterior y los archivos
+    intermedios se escriben en segundo plano (no hay lecturas de disco entre pasos)
+    Con `solo` se calculan únicamente esos KPIs
+    Con `reanudar` se saltan las tareas ya completadas en una corrida que falló
+    Con `forzar` se ejecutan también las tareas cuya huella no cambió
+    Con `perfil` ('cprofile' | 'pyinstrument') se perfila la corrida; las tareas
+    corren entonces en serie, en un solo hilo, para que el perfil las vea todas
+    Al terminar (bien o mal) se escribe el reporte de métricas en data/metricas
+    """
     start = datetime.now()
-    
+
     print("PIPELINE ETL - INDICADORES SOCIALES IADB")
-    
+    config = importlib.import_module('config')
+    config.mostrar_config()
+    config.crear_directorios()
+
+    metricas = importlib.import_module('src.metricas')
+    metricas.reiniciar()
+    exito = False
     try:
-        # Paso 1: Extracción
-        print("\n>>> EJECUTANDO PASO 1: EXTRACCIÓN")
-        extract = importlib.import_module('src.extract.extract')
-        extract.extraer_datos_iadb()
-        
-        # Paso 2: Transformación
-        print("\n>>> EJECUTANDO PASO 2: TRANSFORMACIÓN")
-        transform = importlib.import_module('src.transform.transform')
-        transform.limpiar_datos()
-        
-        # Paso 3: Analytics
-        print("\n>>> EJECUTANDO PASO 3: ANALYTICS")
-        analytics = importlib.import_module('src.analyze.analytics')
-        analytics.calcular_kpis()
-        
-        # Paso 4: Carga
-        print("\n>>> EJECUTANDO PASO 4: CARGA A POSTGRESQL")
-        load = importlib.import_module('src.load.load')
-        load.cargar_a_postgres()
+        with metricas.perfilar(perfil, start), metricas.span('pipeline', en_memoria=en_memoria):
+            if en_memoria:
+                extract = importlib.import_module('src.extract.extract')
+                transform = importlib.import_module('src.transform.transform')
+                analytics = importlib.import_module('src.analyze.analytics')
+                load = importlib.import_module('src.load.load')
+                storage = importlib.import_module('src.storage')
+                with storage.SumideroAsincrono() as sumidero:
+                    print("\n>>> EJECUTANDO PASO 1: EXTRACCIÓN (en memoria)")
+                    with metricas.span('extract'):
+                        datos = extract.extraer_datos_iadb(en_memoria=True, sumidero=sumidero)
+
+                    print("\n>>> EJECUTANDO PASO 2: TRANSFORMACIÓN (en memoria)")
+                    with metricas.span('transform'):
+                        df_unified = transform.limpiar_datos(datos, sumidero=sumidero)
+                    del datos
+
+                    print("\n>>> EJECUTANDO PASO 3: ANALYTICS (en memoria)")
+                    with metricas.span('analytics'):
+                        kpis = analytics.calcular_kpis(df_unified, sumidero=sumidero, solo=solo)
+
+                    print("\n>>> EJECUTANDO PASO 4: CARGA A POSTGRESQL (en memoria)")
+                    with metricas.span('load'):
+                        load.cargar_a_postgres(df_unified, kpis)
+
+                    print("\nEsperando escrituras pendientes a disco...")
+            else:
+                planificador = importlib.import_module('src.planificador')
+                cliente_mod = importlib.import_module('src.extract.cliente')
+                with cliente_mod.ClienteHTTP() as cliente:
+                    workers = 0 if perfil else planificador.PIPELINE_MAX_WORKERS
+                    plan = planificador.Planificador(workers=workers, reanudar=reanudar, forzar=forzar)
+                    descartar = construir_tareas(plan, cliente, solo)
+                    print(f"\n>>> EJECUTANDO {len(plan.tareas)} TAREAS ({plan.workers or 1} en paralelo)")
+                    try:
+                        plan.ejecutar()
+                    except Exception:
+                        descartar()
+                        raise
 
         print("PIPELINE COMPLETADO EXITOSAMENTE")
-        
+        exito = True
         return True
-        
+
     except Exception as e:
         print(f"\n ERROR EN PIPELINE: {e}")
         import traceback
         traceback.print_exc()
         return False
 
+    finally:
+        ruta = metricas.guardar_reporte(start, exito=exito, en_memoria=en_memoria, solo=solo, perfil=perfil)
+        print(f"Reporte de métricas: {ruta} (pico de memoria: {metricas.rss_max_mb():.0f} MB)")
+
 if __name__ == '__main__':
-    success = run_pipeline()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pipeline ETL - Indicadores sociales IADB")
+    parser.add_argument('--en-memoria', action='store_true',
+                        help="Pasar los DataFrames entre pasos y escribir los archivos en segundo plano")
+    parser.add_argument('--only', type=lambda s: [n.strip() for n in s.split(',') if n.strip()],
+                        help="KPIs a calcular, separados por comas (p. ej. promedios_pais,rankings)")
+    parser.add_argument('--reanudar', action='store_true',
+                        help="Retomar una corrida que falló, saltando las tareas ya completadas")
+    parser.add_argument('--force', action='store_true',
+                        help="Ejecutar todas las tareas aunque sus entradas, código y configuración no hayan cambiado")
+    parser.add_argument('--perfil', choices=['cprofile', 'pyinstrument'],
+                        help="Perfilar la corrida (las tareas se ejecutan en serie); el perfil queda en data/metricas")
+    args = parser.parse_args()
+
+    success = run_pipeline(en_memoria=args.en_memoria, solo=args.only, reanudar=args.reanudar,
+                           forzar=args.force, perfil=args.perfil)
+    sys.exit(0 if success else 1)
@@ -1,96 +1,314 @@
 """
 PASO 3: PROCESAMIENTO ANALÍTICO
 Calcula KPIs y métricas agregadas
+Cada KPI se declara en el registro KPIS (entradas, agrupación, agregación);
+EvaluadorKPIs calcula solo los pedidos y comparte los intermedios entre ellos
 """
+import argparse
+import json
+import os
+import threading
+import numpy as np
 import pandas as pd
-from config import PROCESSED_DIR, ANALYTICS_DIR
+from config import PROCESSED_DIR, ANALYTICS_DIR, ANALYTICS_INCREMENTAL, ANALYTICS_STATE, SHARD_WORKERS
+from src import esquema, fragmentos, metricas
+from src.analyze.kpis import KPIS, validar_kpis
+from src.storage import (SumideroAsincrono, escribir_tabla, existe_tabla, guardar, hashes_particiones,
+                         leer_tabla, ruta_tabla)
+from src.transform.transform import CLAVES
 
-def calcular_kpis():
-    """Calcula KPIs principales a partir de datos limpios"""
+COLUMNAS_PISA = ['meanscoreinmathematics(pisa)', 'meanscoreinreading(pisa)', 'meanscoreinscience(pisa)']
+
+# Dirección de cada indicador para los rankings: 1 = mayor es mejor, -1 = menor es mejor
+# Los indicadores que no aparecen se rankean como "mayor es mejor"
+DIRECCION_INDICADORES = {
+    'percentageofthepopulationinpoverty': -1,
+    'earlyschooldropoutrate': -1,
+    'grossattendancerateprimaryeducation': 1,
+    'grossattendanceratesecondaryeducation': 1,
+    'grossattendanceratetertiaryeducation': 1,
+    'meanscoreinscience(pisa)': 1,
+    'meanscoreinreading(pisa)': 1,
+    'meanscoreinmathematics(pisa)': 1,
+    'percentagewithaccesstoschoolswithinternet': 1,
+}
+
+# Suma y conteo por (país, año) de cada indicador: las medias por país y por año salen de aquí
+TABLA_ESTADO = '_estado_kpis'
+
+def estado_agregado(df: pd.DataFrame, columnas: list[str]) -> pd.DataFrame:
+    """Estado combinable: nombre del país, `<col>__suma` y `<col>__n` por (country_code, year)"""
+    # observed=True: con dimensiones categóricas solo las combinaciones presentes
+    grupos = df.groupby(['country_code', 'year'], sort=True, observed=True)
+    return pd.concat([
+        grupos['country_name'].first(),
+        # Las sumas en float64 aunque los indicadores sean float32
+        grupos[columnas].sum().astype('float64').add_suffix('__suma'),
+        grupos[columnas].count().add_suffix('__n'),
+    ], axis=1).reset_index()
+
+def estado_fragmentado(df: pd.DataFrame, columnas: list[str], workers: int = SHARD_WORKERS) -> pd.DataFrame:
+    """
+    estado_agregado por fragmentos de países en el pool de procesos
+    Los fragmentos son contiguos y el estado va ordenado por (country_code, year):
+    la reducción es solo concatenar
+    """
+    partes = fragmentos.repartir(df['country_code'].dropna().unique(), workers)
+    if len(partes) < 2:
+        return estado_agregado(df, columnas)
+    argumentos = [(df[df['country_code'].isin(p)], columnas) for p in partes]
+    return pd.concat(fragmentos.ejecutar(estado_agregado, argumentos, 'estado', workers), ignore_index=True)
+
+def medias(estado: pd.DataFrame, por: str, columnas: list[str]) -> pd.DataFrame:
+    """Media de cada columna agrupando el estado por `por` (suma de sumas / suma de conteos)"""
+    grupos = estado.groupby(por, sort=True, observed=True)
+    sumas = grupos[[f'{c}__suma' for c in columnas]].sum()
+    conteos = grupos[[f'{c}__n' for c in columnas]].sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valores = sumas.to_numpy() / conteos.to_numpy()
+    return pd.DataFrame(valores, index=sumas.index, columns=columnas)
+
+def combinar(anterior: pd.DataFrame | None, nuevo: pd.DataFrame, columna: str,
+             reemplazar: set, orden: list[str]) -> pd.DataFrame:
+    """Filas de `anterior` cuya `columna` no está en `reemplazar`, más `nuevo`, ordenadas por `orden`"""
+    if anterior is None:
+        # Cálculo completo: se respeta el orden de entrada (unified_data ya viene ordenado por CLAVES)
+        return nuevo
+    partes = [p for p in [anterior[~anterior[columna].isin(reemplazar)], nuevo] if len(p)] or [nuevo]
+    return pd.concat(partes, ignore_index=True).sort_values(orden, kind='stable').reset_index(drop=True)
+
+def leer_estado(columnas: list[str]) -> dict | None:
+    """Estado de la corrida anterior, si es reutilizable (mismas columnas)"""
+    try:
+        meta = json.loads(ANALYTICS_STATE.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    hashes = meta.get('hashes')
+    if meta.get('columnas') != columnas or not isinstance(hashes, dict) \
+       or not all(isinstance(h, dict) for h in hashes.values()):
+        return None
+    return meta
+
+def guardar_estado(meta: dict):
+    ANALYTICS_STATE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ANALYTICS_STATE.with_suffix('.json.tmp')
+    tmp.write_text(json.dumps(meta, indent=2, ensure_ascii=False))
+    os.replace(tmp, ANALYTICS_STATE)
+
+class EvaluadorKPIs:
+    """
+    Evalúa KPIs del registro sobre un mismo DataFrame, bajo demanda
+    Los intermedios (estado suma/conteo, medias por clave) se calculan una sola
+    vez y los comparten todos los KPIs que los usan
+    Con `previo` (estado de la corrida anterior) cada KPI solo recalcula los
+    años cuyo hash cambió desde la última vez que se calculó
+    """
+
+    def __init__(self, df: pd.DataFrame, previo: dict | None = None):
+        self.df = df
+        self.previo = previo
+        self.hashes = hashes_particiones(df, CLAVES)
+        self._intermedios = {}
+        self._lock = threading.RLock()
+
+        self.columnas = {
+            'numericas': esquema.indicadores(df),
+            'pisa': [col for col in COLUMNAS_PISA if col in df.columns],
+            'todas': list(df.columns),
+        }
+
+    def _intermedio(self, clave, calcular):
+        # Los KPIs pueden evaluarse desde varios hilos: cada intermedio se calcula una vez
+        with self._lock:
+            if clave not in self._intermedios:
+                self._intermedios[clave] = calcular()
+            return self._intermedios[clave]
+
+    def hashes_previos(self, nombre: str) -> dict[str, str] | None:
+        """Hashes con los que se calculó `nombre` la última vez (None = cálculo completo)"""
+        if self.previo is None:
+            return None
+        tabla = TABLA_ESTADO if nombre == TABLA_ESTADO else KPIS[nombre]['tabla']
+        anteriores = self.previo.get('hashes', {}).get(nombre)
+        return anteriores if anteriores is not None and existe_tabla(ANALYTICS_DIR, tabla) else None
+
+    def cambios(self, nombre: str) -> tuple[set[int], set[int]]:
+        """(años nuevos o modificados, años eliminados) desde la última vez que se calculó `nombre`"""
+        anteriores = self.hashes_previos(nombre)
+        if anteriores is None:
+            return {int(y) for y in self.hashes}, set()
+        afectados = {int(y) for y, h in self.hashes.items() if anteriores.get(y) != h}
+        eliminados = {int(y) for y in anteriores if y not in self.hashes}
+        return afectados, eliminados
+
+    def anterior(self, nombre: str) -> pd.DataFrame | None:
+        if self.hashes_previos(nombre) is None:
+            return None
+        return leer_tabla(ANALYTICS_DIR, KPIS[nombre]['tabla'])
+
+    def filas(self, years: set[int]) -> pd.DataFrame:
+        """Filas de `years` (todo el DataFrame, sin copiar, si son todos los años)"""
+        if len(years) == len(self.hashes):
+            return self.df
+        return self.df[self.df['year'].isin(years)]
+
+    def estado_calculado(self) -> bool:
+        return 'estado' in self._intermedios
+
+    def estado(self) -> pd.DataFrame:
+        """Estado suma/conteo actualizado: solo se reagregan los años que cambiaron"""
+        def calcular():
+            afectados, eliminados = self.cambios(TABLA_ESTADO)
+            # El estado es por país: con SHARD_WORKERS se agrega por fragmentos en paralelo
+            agregar = estado_fragmentado if SHARD_WORKERS > 0 else estado_agregado
+            nuevo = agregar(self.filas(afectados), self.columnas['numericas'])
+            previo = leer_tabla(ANALYTICS_DIR, TABLA_ESTADO) if self.hashes_previos(TABLA_ESTADO) is not None else None
+            return combinar(previo, nuevo, 'year', afectados | eliminados, ['country_code', 'year'])
+        return self._intermedio('estado', calcular)
+
+    def medias(self, por: str) -> pd.DataFrame:
+        """Medias de todos los indicadores por `por`, desde el estado"""
+        return self._intermedio(('medias', por),
+                                lambda: medias(self.estado(), por, self.columnas['numericas']))
+
+    def atributos(self, por: str, columnas: list[str]) -> pd.DataFrame:
+        return self._intermedio(('atributos', por, tuple(columnas)),
+                                lambda: self.estado().groupby(por, sort=True, observed=True)[columnas].first())
+
+    def calcular(self, nombre: str) -> pd.DataFrame | None:
+        """Calcula un KPI del registro (None si es opcional y no tiene entradas)"""
+        kpi = KPIS[nombre]
+        columnas = self.columnas[kpi['entradas']]
+        if kpi.get('opcional') and not columnas:
+            return None
+        return AGREGACIONES[kpi['agregacion']](self, nombre, kpi, columnas)
+
+def agregar_media(ev: EvaluadorKPIs, nombre: str, kpi: dict, columnas: list[str]) -> pd.DataFrame:
+    """
+    Media de las entradas por `por`
+    Por año solo se reemplazan los años que cambiaron; por otra clave (p. ej. país)
+    cualquier año puede mover todos los grupos, así que se toman todos desde el estado
+    """
+    por = kpi['por']
+    partes = [ev.atributos(por, kpi['atributos'])] if kpi.get('atributos') else []
+    nuevo = pd.concat(partes + [ev.medias(por)[columnas]], axis=1)
+    if por != 'year':
+        return nuevo.round(2).reset_index()
+    afectados, eliminados = ev.cambios(nombre)
+    nuevo = nuevo[nuevo.index.isin(afectados)].round(2).reset_index()
+    return combinar(ev.anterior(nombre), nuevo, 'year', afectados | eliminados, ['year'])
+
+def agregar_vs_media(ev: EvaluadorKPIs, nombre: str, kpi: dict, columnas: list[str]) -> pd.DataFrame:
+    """
+    Cada fila con la media de su grupo y la diferencia contra ella, como un solo
+    bloque con las columnas intercaladas: <col>_regional_avg, <col>_vs_regional
+    """
+    por = kpi['por']
+    afectados, eliminados = ev.cambios(nombre)
+    filas = ev.filas(afectados)
+    media = ev.medias(por)[columnas].reindex(filas[por]).to_numpy()
+    # Del mismo tipo que los indicadores (float32 si vienen compactos)
+    bloque = np.empty((len(filas), 2 * len(columnas)), dtype=np.result_type(np.float32, *filas[columnas].dtypes))
+    bloque[:, 0::2] = media
+    bloque[:, 1::2] = np.round(filas[columnas].to_numpy() - media, 2)
+    nombres = [f'{col}_{sufijo}' for col in columnas for sufijo in ('regional_avg', 'vs_regional')]
+    nuevo = pd.concat([filas.reset_index(drop=True), pd.DataFrame(bloque, columns=nombres)], axis=1)
+    return combinar(ev.anterior(nombre), nuevo, 'year', afectados | eliminados, CLAVES)
+
+def agregar_ranking(ev: EvaluadorKPIs, nombre: str, kpi: dict, columnas: list[str]) -> pd.DataFrame:
+    """Ranking de cada indicador en el último año disponible, según DIRECCION_INDICADORES"""
+    ultimo_año = ev.df['year'].max()
+    anteriores = ev.hashes_previos(nombre)
+    afectados, _ = ev.cambios(nombre)
+    if anteriores and max(int(y) for y in anteriores) == int(ultimo_año) and int(ultimo_año) not in afectados:
+        print(f"  = Sin cambios en {ultimo_año}: se conservan los rankings")
+        return ev.anterior(nombre)
+
+    ultimo = ev.df.loc[ev.df['year'] == ultimo_año, kpi['atributos'] + columnas]
+    # Todos los indicadores en un solo rank() ascendente: "mayor es mejor" con el signo cambiado
+    signo = np.array([-DIRECCION_INDICADORES.get(col, 1) for col in columnas], dtype=float)
+    rankings = (ultimo[columnas] * signo).rank(ascending=True).add_suffix('_rank')
+    return pd.concat([ultimo, rankings], axis=1)
+
+def agregar_identidad(ev: EvaluadorKPIs, nombre: str, kpi: dict, columnas: list[str]) -> pd.DataFrame:
+    """El mismo DataFrame (no se copia ni se modifica)"""
+    return ev.df if columnas == list(ev.df.columns) else ev.df[columnas]
+
+AGREGACIONES = {
+    'media': agregar_media,
+    'vs_media': agregar_vs_media,
+    'ranking': agregar_ranking,
+    'identidad': agregar_identidad,
+}
+
+def preparar_kpis(df: pd.DataFrame | None = None, incremental: bool = ANALYTICS_INCREMENTAL) -> EvaluadorKPIs:
+    """Lee unified_data (si no viene `df`) y arma el evaluador con el estado de la corrida anterior"""
+    if df is None:
+        if not existe_tabla(PROCESSED_DIR, 'unified_data'):
+            raise FileNotFoundError(f"No existe {ruta_tabla(PROCESSED_DIR, 'unified_data')}. Ejecuta 2_transform.py primero.")
+        with metricas.span('kpi:leer'):
+            df = esquema.aplicar(leer_tabla(PROCESSED_DIR, 'unified_data'))
+    print(f"\nDatos cargados: {len(df)} filas")
+    print(f"Columnas: {list(df.columns)}\n")
+    
+    previo = leer_estado(list(df.columns)) if incremental else None
+    evaluador = EvaluadorKPIs(df, previo)
+    if previo is not None:
+        afectados, eliminados = evaluador.cambios(TABLA_ESTADO)
+        print(f"Modo incremental: {len(afectados)} años nuevos o modificados, {len(eliminados)} eliminados\n")
+    return evaluador
+
+def calcular_kpi(evaluador: EvaluadorKPIs, nombre: str,
+                 sumidero: SumideroAsincrono | None = None) -> pd.DataFrame | None:
+    """Calcula y guarda un KPI del registro"""
+    kpi = KPIS[nombre]
+    print(f"Calculando {kpi['titulo']}...")
+    with metricas.span(f"kpi:{nombre}"):
+        df_kpi = evaluador.calcular(nombre)
+        if df_kpi is None:
+            return None
+        # Los KPIs conservan el esquema: medias y rankings de indicadores acotados en float32
+        df_kpi = esquema.aplicar(df_kpi)
+        guardar(df_kpi, ANALYTICS_DIR, kpi['tabla'], sumidero)
+    resumen = kpi['resumen'].format(filas=len(df_kpi), columnas=len(evaluador.columnas[kpi['entradas']]))
+    print(f"  ✓ Guardado: {resumen}")
+    return df_kpi
+
+def guardar_estado_kpis(evaluador: EvaluadorKPIs, calculados: list[str]):
+    """Estado para la próxima corrida (el JSON al final: sin él se recalcula todo)"""
+    previo = evaluador.previo
+    hashes = dict(previo['hashes']) if previo is not None else {}
+    hashes.update({nombre: evaluador.hashes for nombre in calculados})
+    if evaluador.estado_calculado():
+        escribir_tabla(evaluador.estado(), ANALYTICS_DIR, TABLA_ESTADO)
+        hashes[TABLA_ESTADO] = evaluador.hashes
+    guardar_estado({'columnas': list(evaluador.df.columns), 'hashes': hashes})
+
+def calcular_kpis(df: pd.DataFrame | None = None, sumidero: SumideroAsincrono | None = None,
+                  incremental: bool = ANALYTICS_INCREMENTAL, solo: list[str] | None = None):
+    """
+    Calcula KPIs principales a partir de datos limpios
+    Con `df` (salida de limpiar_datos) no se lee unified_data de disco
+    y, si hay `sumidero`, los KPIs se guardan en segundo plano
+    Con `solo` se calculan y guardan únicamente esos KPIs del registro
+    En modo incremental solo se recalculan los años cuyo hash cambió; el resto
+    se toma de los KPIs anteriores. Las medias salen siempre del estado
+    suma/conteo, así que el resultado es idéntico al de un cálculo completo
+    """
     print("="*60)
     print("PASO 3: PROCESAMIENTO ANALÍTICO (KPIs)")
     print("="*60)
     
-    # Leer datos limpios
-    input_file = PROCESSED_DIR / 'unified_data.csv'
-    if not input_file.exists():
-        raise FileNotFoundError(f"No existe {input_file}. Ejecuta 2_transform.py primero.")
-    
-    df = pd.read_csv(input_file)
-    print(f"\nDatos cargados: {len(df)} filas")
-    print(f"Columnas: {list(df.columns)}\n")
+    nombres = validar_kpis(solo)
+    evaluador = preparar_kpis(df, incremental)
     
     kpis = {}
+    for nombre in nombres:
+        df_kpi = calcular_kpi(evaluador, nombre, sumidero)
+        if df_kpi is not None:
+            kpis[nombre] = df_kpi
     
-    # KPI 1: Promedio por País
-    print("Calculando KPI 1: Promedios por País...")
-    kpi1 = df.groupby('country_code').agg({
-        'country_name': 'first',
-        **{col: 'mean' for col in df.columns if col in ['meanscoreinmathematics(pisa)', 'meanscoreinreading(pisa)', 'meanscoreinscience(pisa)']}
-    }).round(2).reset_index()
-    
-    kpi1.to_csv(ANALYTICS_DIR / 'kpi_promedios_pais.csv', index=False)
-    print(f"  ✓ Guardado: {len(kpi1)} países")
-    kpis['promedios_pais'] = kpi1
-    
-    # KPI 2: Evolución Temporal
-    print("Calculando KPI 2: Evolución Temporal...")
-    kpi2 = df.groupby('year').agg({
-        col: 'mean' for col in df.columns if col in ['meanscoreinmathematics(pisa)', 'meanscoreinreading(pisa)', 'meanscoreinscience(pisa)']
-    }).round(2).reset_index()
-    
-    kpi2.to_csv(ANALYTICS_DIR / 'kpi_evolucion_temporal.csv', index=False)
-    print(f"  ✓ Guardado: {len(kpi2)} años")
-    kpis['evolucion_temporal'] = kpi2
-    
-    # KPI 3: Datos por País y Año
-    print("Calculando KPI 3: Matriz País-Año...")
-    kpi3 = df.copy()
-    kpi3.to_csv(ANALYTICS_DIR / 'kpi_pais_año.csv', index=False)
-    print(f"  ✓ Guardado: {len(kpi3)} registros")
-    kpis['pais_año'] = kpi3
-    
-    # KPI 4: Rankings (si hay columnas numéricas)
-    print("Calculando KPI 4: Rankings...")
-    numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
-    numeric_cols = [col for col in numeric_cols if col != 'year']
-    
-    if len(numeric_cols) > 0:
-        # Usar último año disponible
-        ultimo_año = df['year'].max()
-        df_ultimo = df[df['year'] == ultimo_año].copy()
-        
-        kpi4 = df_ultimo[['country_code', 'country_name'] + list(numeric_cols)].copy()
-        
-        # Calcular rankings para cada indicador
-        for col in numeric_cols:
-            if col in kpi4.columns:
-                # Determinar si menor es mejor o mayor es mejor
-                if any(word in col.lower() for word in ['poverty', 'unemployment', 'dropout', 'gini']):
-                    # Menor es mejor
-                    kpi4[f'{col}_rank'] = kpi4[col].rank(ascending=True)
-                else:
-                    # Mayor es mejor
-                    kpi4[f'{col}_rank'] = kpi4[col].rank(ascending=False)
-        
-        kpi4.to_csv(ANALYTICS_DIR / 'kpi_rankings.csv', index=False)
-        print(f"  ✓ Guardado: rankings de {len(numeric_cols)} indicadores")
-        kpis['rankings'] = kpi4
-    
-    # KPI 5: Comparación Regional
-    print("Calculando KPI 5: Comparación Regional...")
-    kpi5 = df.copy()
-    
-    # Calcular promedios regionales por año
-    for col in numeric_cols:
-        if col in df.columns:
-            regional_avg = df.groupby('year')[col].transform('mean')
-            kpi5[f'{col}_regional_avg'] = regional_avg
-            kpi5[f'{col}_vs_regional'] = (df[col] - regional_avg).round(2)
-    
-    kpi5.to_csv(ANALYTICS_DIR / 'kpi_comparacion_regional.csv', index=False)
-    print(f"  ✓ Guardado: comparaciones regionales")
-    kpis['comparacion_regional'] = kpi5
+    guardar_estado_kpis(evaluador, list(kpis))
     
     # Resumen
     print("\n" + "="*60)
@@ -102,8 +320,13 @@ def calcular_kpis():
     return kpis
 
 if __name__ == '__main__':
-    kpis = calcular_kpis()
+    parser = argparse.ArgumentParser(description="Cálculo de KPIs")
+    parser.add_argument('--only', type=lambda s: [n.strip() for n in s.split(',') if n.strip()],
+                        help=f"KPIs a calcular, separados por comas ({', '.join(KPIS)})")
+    args = parser.parse_args()
+
+    kpis = calcular_kpis(solo=args.only)
     print("\n" + "="*60)
     print("PROCESAMIENTO ANALÍTICO COMPLETADO")
     print("="*60)
-    print(f"Archivos guardados en: {ANALYTICS_DIR}")
\ No newline at end of file
+    print(f"Archivos guardados en: {ANALYTICS_DIR}")
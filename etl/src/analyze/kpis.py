@@ -0,0 +1,64 @@
+"""
+Registro de KPIs
+Solo declaraciones (sin pandas): run_all.py arma las tareas y sus huellas
+sin importar la etapa de analytics
+"""
+
+# Registro de KPIs
+#   entradas:   'pisa' (COLUMNAS_PISA), 'numericas' (todos los indicadores) o 'todas'
+#   por:        clave de agrupación ('country_code' o 'year', el grano del estado suma/conteo)
+#   atributos:  columnas descriptivas que acompañan a la agrupación
+#   agregacion: 'media', 'vs_media' (fila contra la media del grupo), 'ranking' (último año) o 'identidad'
+#   opcional:   se omite si no hay columnas de entrada
+#   resumen:    mensaje al guardar ({filas}, {columnas})
+KPIS = {
+    'promedios_pais': {
+        'titulo': 'KPI 1: Promedios por País',
+        'tabla': 'kpi_promedios_pais',
+        'entradas': 'pisa',
+        'por': 'country_code',
+        'atributos': ['country_name'],
+        'agregacion': 'media',
+        'resumen': '{filas} países',
+    },
+    'evolucion_temporal': {
+        'titulo': 'KPI 2: Evolución Temporal',
+        'tabla': 'kpi_evolucion_temporal',
+        'entradas': 'pisa',
+        'por': 'year',
+        'agregacion': 'media',
+        'resumen': '{filas} años',
+    },
+    'pais_año': {
+        'titulo': 'KPI 3: Matriz País-Año',
+        'tabla': 'kpi_pais_año',
+        'entradas': 'todas',
+        'agregacion': 'identidad',
+        'resumen': '{filas} registros',
+    },
+    'rankings': {
+        'titulo': 'KPI 4: Rankings',
+        'tabla': 'kpi_rankings',
+        'entradas': 'numericas',
+        'atributos': ['country_code', 'country_name'],
+        'agregacion': 'ranking',
+        'opcional': True,
+        'resumen': 'rankings de {columnas} indicadores',
+    },
+    'comparacion_regional': {
+        'titulo': 'KPI 5: Comparación Regional',
+        'tabla': 'kpi_comparacion_regional',
+        'entradas': 'numericas',
+        'por': 'year',
+        'agregacion': 'vs_media',
+        'resumen': 'comparaciones regionales',
+    },
+}
+
+def validar_kpis(solo: list[str] | None = None) -> list[str]:
+    """Nombres de KPIs a calcular (todos si `solo` es None)"""
+    nombres = list(KPIS) if solo is None else list(solo)
+    desconocidos = [n for n in nombres if n not in KPIS]
+    if desconocidos:
+        raise ValueError(f"KPIs desconocidos: {desconocidos}. Disponibles: {list(KPIS)}")
+    return nombres
@@ -0,0 +1,96 @@
+"""
+Esquema tipado del pipeline
+- dimensiones (país, área, sexo): categóricas, con las categorías ordenadas
+  para que ordenar por código sea lo mismo que ordenar por texto
+- year: int16
+- indicadores: float32 los acotados conocidos (porcentajes, puntajes PISA) y
+  las columnas derivadas de ellos (<indicador>_rank, <indicador>_vs_regional, ...);
+  el resto float64. El tipo depende solo del nombre, no de los valores de la
+  corrida: una columna no cambia de tipo (ni de REAL a DOUBLE PRECISION) entre cargas
+Se aplica al leer en extract y transform y se conserva en analytics; en la
+carga cada dtype se traduce a un tipo compacto de PostgreSQL (tipo_postgres)
+"""
+import pandas as pd
+
+DIMENSIONES = ['country_code', 'country_name', 'area', 'sex']
+TIPO_YEAR = 'int16'
+TIPO_INDICADOR = 'float32'
+TIPO_INDICADOR_LIBRE = 'float64'
+
+# Indicadores que siempre quedan bajo 1024 en valor absoluto: ahí la separación
+# entre float32 es de 6.1e-5 como máximo, así que redondear a 4 decimales devuelve
+# el valor de la fuente
+INDICADORES_ACOTADOS = [
+    'percentageofthepopulationinpoverty',
+    'earlyschooldropoutrate',
+    'grossattendancerateprimaryeducation',
+    'grossattendanceratesecondaryeducation',
+    'grossattendanceratetertiaryeducation',
+    'meanscoreinscience(pisa)',
+    'meanscoreinreading(pisa)',
+    'meanscoreinmathematics(pisa)',
+    'percentagewithaccesstoschoolswithinternet',
+]
+
+
+def categorica(serie: pd.Series) -> pd.Series:
+    """Serie categórica con las categorías ordenadas (no copia si ya lo está)"""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        categorias = serie.cat.categories
+        if categorias.is_monotonic_increasing:
+            return serie
+        return serie.cat.reorder_categories(categorias.sort_values())
+    return serie.astype('category')
+
+
+def tipo_indicador(columna: str) -> str:
+    """dtype de una columna de indicador según su nombre (o el del indicador del que deriva)"""
+    if any(columna == i or columna.startswith(f"{i}_") for i in INDICADORES_ACOTADOS):
+        return TIPO_INDICADOR
+    return TIPO_INDICADOR_LIBRE
+
+
+def indicadores(df: pd.DataFrame) -> list[str]:
+    """Columnas de indicadores (las numéricas de punto flotante)"""
+    return [c for c in df.columns if pd.api.types.is_float_dtype(df[c].dtype)]
+
+
+def aplicar(df: pd.DataFrame, indicador: str | None = None) -> pd.DataFrame:
+    """
+    Tipos compactos: dimensiones categóricas, year int16 e indicadores con el
+    tipo de tipo_indicador(). `indicador` es el indicador de la columna `value`
+    de las tablas raw (sin él, float64). Devuelve el mismo DataFrame si ya cumple el esquema
+    """
+    cambios = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if columna in DIMENSIONES:
+            compacta = categorica(serie)
+            if compacta is not serie:
+                cambios[columna] = compacta
+        elif columna == 'year':
+            if serie.dtype != TIPO_YEAR:
+                cambios[columna] = serie.astype(TIPO_YEAR)
+        elif columna == 'value' or pd.api.types.is_float_dtype(serie.dtype):
+            tipo = tipo_indicador((indicador or '') if columna == 'value' else columna)
+            if serie.dtype != tipo:
+                cambios[columna] = serie.astype(tipo)
+    if not cambios:
+        return df
+    return df.assign(**cambios)
+
+
+def tipo_postgres(serie: pd.Series) -> str:
+    """Tipo de columna explícito según el dtype (las categóricas según el de sus categorías)"""
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(dtype):
+        return {1: 'SMALLINT', 2: 'SMALLINT', 4: 'INTEGER'}.get(dtype.itemsize, 'BIGINT')
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL' if dtype.itemsize == 4 else 'DOUBLE PRECISION'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
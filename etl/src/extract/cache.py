@@ -0,0 +1,66 @@
+"""
+Caché en disco de respuestas de la API del IADB
+Cada entrada guarda el cuerpo JSON y sus metadatos (ETag, Last-Modified,
+last_modified del recurso y fecha de descarga) para revalidar con peticiones
+condicionales o servir sin red en modo offline
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from config import HTTP_CACHE_DIR, HTTP_CACHE_TTL, OFFLINE
+
+
+class SinCache(Exception):
+    """Modo offline y la respuesta no está en caché"""
+
+
+class CacheHTTP:
+    def __init__(self, directorio: Path = HTTP_CACHE_DIR, ttl: float = HTTP_CACHE_TTL,
+                 offline: bool = OFFLINE):
+        self.directorio = Path(directorio)
+        self.ttl = ttl
+        self.offline = offline
+
+    def _rutas(self, clave: str) -> tuple[Path, Path]:
+        nombre = hashlib.sha256(clave.encode()).hexdigest()
+        return self.directorio / f"{nombre}.json", self.directorio / f"{nombre}.meta.json"
+
+    def leer(self, clave: str) -> tuple[dict, bytes] | None:
+        """Devuelve (metadatos, cuerpo) o None si la entrada no existe"""
+        ruta_body, ruta_meta = self._rutas(clave)
+        try:
+            meta = json.loads(ruta_meta.read_text())
+            if meta.get('clave') != clave:
+                return None
+            return meta, ruta_body.read_bytes()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def guardar(self, clave: str, body: bytes, meta: dict):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta_body, ruta_meta = self._rutas(clave)
+        meta = {**meta, 'clave': clave, 'descargado': time.time()}
+        _escribir_atomico(ruta_body, body)
+        _escribir_atomico(ruta_meta, json.dumps(meta).encode())
+
+    def tocar(self, clave: str, meta: dict):
+        """Marca una entrada como revalidada (respuesta 304)"""
+        _, ruta_meta = self._rutas(clave)
+        meta = {**meta, 'descargado': time.time()}
+        _escribir_atomico(ruta_meta, json.dumps(meta).encode())
+
+    def vigente(self, meta: dict, version: str | None) -> bool:
+        """La entrada sirve sin ir a la red: misma versión del recurso y dentro del TTL"""
+        if version is not None and meta.get('version') != version:
+            return False
+        return time.time() - meta.get('descargado', 0) < self.ttl
+
+
+def _escribir_atomico(ruta: Path, contenido: bytes):
+    tmp = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(contenido)
+    os.replace(tmp, ruta)
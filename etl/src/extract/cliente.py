@@ -0,0 +1,111 @@
+"""
+Cliente HTTP compartido para la extracción
+Una sola sesión con pool de conexiones, límite de peticiones por host
+y caché en disco con revalidación condicional
+"""
+import json
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from config import EXTRACT_MAX_WORKERS, EXTRACT_RATE_LIMIT, HTTP_TIMEOUT
+from src import metricas
+from src.extract.cache import CacheHTTP, SinCache
+
+
+class LimitadorPorHost:
+    """Espacia las peticiones a un mismo host para no superar `por_segundo`"""
+
+    def __init__(self, por_segundo: float):
+        self.intervalo = 1.0 / por_segundo if por_segundo > 0 else 0.0
+        self._lock = threading.Lock()
+        self._siguiente: dict[str, float] = {}
+
+    def esperar(self, url: str):
+        if not self.intervalo:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente.get(host, ahora))
+            self._siguiente[host] = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class ClienteHTTP:
+    """Sesión `requests` reutilizable entre hilos (keep-alive + pool)"""
+
+    def __init__(self, max_conexiones: int = EXTRACT_MAX_WORKERS,
+                 por_segundo: float = EXTRACT_RATE_LIMIT,
+                 timeout: float = HTTP_TIMEOUT, cache: CacheHTTP | None = None):
+        self.timeout = timeout
+        self.cache = cache if cache is not None else CacheHTTP()
+        self.limitador = LimitadorPorHost(por_segundo)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_conexiones, pool_maxsize=max_conexiones)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        self.limitador.esperar(url)
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def get_json(self, url: str, clave: str, version: str | None = None,
+                 revalidar: bool = False, **kwargs) -> dict:
+        """
+        GET con caché: `clave` identifica la respuesta (recurso + filtros) y
+        `version` es el last_modified del recurso según package_show
+        Con `revalidar` se ignora el TTL y siempre se hace la petición condicional
+        """
+        with metricas.span('http:get', url=url) as span:
+            datos, origen = self._get_json(url, clave, version, revalidar, **kwargs)
+            span['atributos']['origen'] = origen
+            metricas.contar(bytes_leidos=len(datos))
+            return json.loads(datos)
+
+    def _get_json(self, url: str, clave: str, version: str | None,
+                  revalidar: bool, **kwargs) -> tuple[bytes, str]:
+        """(cuerpo de la respuesta, origen: 'cache', 'no modificado' o 'red')"""
+        entrada = self.cache.leer(clave)
+        if self.cache.offline:
+            if entrada is None:
+                raise SinCache(f"Modo offline: no hay respuesta en caché para {clave}")
+            return entrada[1], 'cache'
+        if entrada is not None and not revalidar and self.cache.vigente(entrada[0], version):
+            return entrada[1], 'cache'
+
+        headers = dict(kwargs.pop('headers', {}))
+        if entrada is not None and entrada[0].get('version') == version:
+            meta = entrada[0]
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.get(url, headers=headers, **kwargs)
+        if response.status_code == HTTPStatus.NOT_MODIFIED and entrada is not None:
+            self.cache.tocar(clave, entrada[0])
+            return entrada[1], 'no modificado'
+        if not (response.status_code >= HTTPStatus.OK and response.status_code < HTTPStatus.BAD_REQUEST):
+            raise Exception(f"Code {response.status_code}: {response.text}")
+
+        self.cache.guardar(clave, response.content, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'version': version,
+        })
+        return response.content, 'red'
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
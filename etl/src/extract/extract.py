@@ -2,106 +2,121 @@
 PASO 1: EXTRACCIÓN DE DATOS
 Extrae datos de la API del IADB o genera datos de ejemplo
 """
-import requests
 import pandas as pd
 import numpy as np
 import json
+import time
 import traceback
-from http import HTTPStatus
-from config import RAW_DIR, COUNTRIES, ALLOWED_NAMES, FIELDS, YEARS
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable
+from urllib.parse import quote, urljoin
+from config import (RAW_DIR, COUNTRIES, ALLOWED_NAMES, FIELDS, YEARS,
+                    IADB_API_URL, IADB_PACKAGE_ID, EXTRACT_MAX_WORKERS, EXTRACT_PAGE_SIZE,
+                    EXTRACT_INCREMENTAL)
+from src import esquema, metricas
+from src.extract.cliente import ClienteHTTP
+from src.extract.manifiesto import Manifiesto
+from src.storage import (EscritorTabla, SumideroAsincrono, escribir_tabla, existe_tabla,
+                         iterar_tabla, leer_tabla, ruta_tabla)
 
-def generar_datos_ejemplo():
-    """Genera datos sintéticos para demostración"""
+# Columnas de los archivos raw (FIELDS con isoalpha3 renombrado)
+COLUMNS = ['country_code' if f == 'isoalpha3' else f for f in FIELDS]
+
+# Perfil de los indicadores sintéticos: (mínimo, máximo, tendencia anual)
+PERFILES_EJEMPLO = {
+    "Percentage of the population in poverty": (0.10, 0.45, -0.005),
+    "Early school dropout rate": (0.05, 0.20, -0.002),
+    "Gross attendance rate primary education": (0.85, 1.05, 0.001),
+    "Gross attendance rate secondary education": (0.65, 0.95, 0.003),
+    "Gross attendance rate tertiary education": (0.20, 0.60, 0.005),
+    "Mean score in science (PISA)": (380, 450, 0.8),
+    "Mean score in reading (PISA)": (380, 450, 0.8),
+    "Mean score in mathematics (PISA)": (360, 430, 0.8),
+    "Percentage with access to schools with internet": (0.30, 0.85, 0.02),
+}
+
+def generar_datos_ejemplo(n_paises: int = len(COUNTRIES), años: tuple[int, int] = (2010, 2023),
+                          areas: tuple[str, ...] = ('Total',), sexos: tuple[str, ...] = ('Total',),
+                          ratio_faltantes: float = 0.0, n_indicadores: int = len(ALLOWED_NAMES),
+                          seed: int = 42, filas_por_chunk: int | None = None,
+                          directorio: Path = RAW_DIR) -> dict[str, Path]:
+    """
+    Genera datos sintéticos con el mismo formato que la extracción real
+    (un archivo por indicador con year, country_code, area, value, sex)
+
+    Todo se calcula con operaciones vectorizadas de NumPy sobre la grilla
+    país × año × área × sexo. Con `filas_por_chunk` se escribe por bloques de
+    países para no tener el indicador completo en memoria. La salida es la
+    misma para el mismo seed y los mismos parámetros.
+    """
     print("\nGenerando datos de ejemplo...")
-    
-    np.random.seed(42)
-    years = list(range(2010, 2024))
-    
-    # Dataset 1: Pobreza
-    data_pobreza = []
-    for country in COUNTRIES:
-        base = np.random.uniform(15, 45)
-        for year in years:
-            trend = -0.5 * (year - 2010)
-            noise = np.random.normal(0, 2)
-            pobreza = max(5, base + trend + noise)
-            
-            data_pobreza.append({
-                'country_code': country,
-                'year': year,
-                'poverty_rate': round(pobreza, 2),
-                'extreme_poverty': round(pobreza * 0.4, 2),
-                'gini_index': round(np.random.uniform(0.40, 0.55), 3)
-            })
-    
-    df_pobreza = pd.DataFrame(data_pobreza)
-    df_pobreza.to_csv(RAW_DIR / 'poverty_data.csv', index=False)
-    print(f"✓ Pobreza: {len(df_pobreza)} registros")
-    
-    # Dataset 2: Educación
-    data_edu = []
-    for country in COUNTRIES:
-        base = np.random.uniform(7, 11)
-        for year in years:
-            trend = 0.1 * (year - 2010)
-            avg_years = base + trend + np.random.normal(0, 0.3)
-            
-            data_edu.append({
-                'country_code': country,
-                'year': year,
-                'avg_years_education': round(avg_years, 2),
-                'primary_attendance': round(np.random.uniform(85, 98), 2),
-                'secondary_attendance': round(np.random.uniform(65, 90), 2),
-                'dropout_rate': round(np.random.uniform(5, 20), 2)
-            })
-    
-    df_edu = pd.DataFrame(data_edu)
-    df_edu.to_csv(RAW_DIR / 'education_data.csv', index=False)
-    print(f"✓ Educación: {len(df_edu)} registros")
-    
-    # Dataset 3: Empleo
-    data_emp = []
-    for country in COUNTRIES:
-        for year in years:
-            data_emp.append({
-                'country_code': country,
-                'year': year,
-                'unemployment_rate': round(np.random.uniform(3, 12), 2),
-                'employment_rate': round(np.random.uniform(55, 75), 2),
-                'informal_rate': round(np.random.uniform(30, 60), 2)
-            })
-    
-    df_emp = pd.DataFrame(data_emp)
-    df_emp.to_csv(RAW_DIR / 'employment_data.csv', index=False)
-    print(f"✓ Empleo: {len(df_emp)} registros")
-    
-    # Dataset 4: Infraestructura
-    data_infra = []
-    for country in COUNTRIES:
-        for year in years:
-            data_infra.append({
-                'country_code': country,
-                'year': year,
-                'electricity_access': round(np.random.uniform(85, 99), 2),
-                'water_access': round(np.random.uniform(80, 98), 2),
-                'internet_access': round(np.random.uniform(30, 85), 2)
-            })
-    
-    df_infra = pd.DataFrame(data_infra)
-    df_infra.to_csv(RAW_DIR / 'infrastructure_data.csv', index=False)
-    print(f"✓ Infraestructura: {len(df_infra)} registros")
-    
-    return {
-        'poverty': df_pobreza,
-        'education': df_edu,
-        'employment': df_emp,
-        'infrastructure': df_infra
-    }
-
-def extraer_datos_iadb():
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    paises = list(COUNTRIES[:n_paises]) + [f"S{i:05d}" for i in range(max(0, n_paises - len(COUNTRIES)))]
+    years = np.arange(años[0], años[1] + 1)
+    nombres = list(PERFILES_EJEMPLO)[:n_indicadores] \
+        + [f"Synthetic indicator {i:03d}" for i in range(max(0, n_indicadores - len(PERFILES_EJEMPLO)))]
+
+    # Grilla de un país: año × área × sexo (se repite por cada país)
+    celdas = len(years) * len(areas) * len(sexos)
+    year_idx = np.repeat(np.arange(len(years)), len(areas) * len(sexos))
+    area_idx = np.tile(np.repeat(np.arange(len(areas)), len(sexos)), len(years))
+    sexo_idx = np.tile(np.arange(len(sexos)), len(years) * len(areas))
+
+    paises_por_chunk = max(1, (filas_por_chunk or celdas * n_paises) // celdas)
+    archivos = {}
+
+    for k, nombre in enumerate(nombres):
+        lo, hi, tendencia = PERFILES_EJEMPLO.get(nombre, (0.0, 1.0, 0.0))
+        rng = np.random.default_rng([seed, k])
+        # Los faltantes salen de otro generador: así no dependen de filas_por_chunk
+        rng_faltantes = np.random.default_rng([seed, k, 1])
+        escala = hi - lo
+        base = rng.uniform(lo, hi, size=n_paises)
+        efecto_area = rng.normal(0, escala * 0.05, size=len(areas))
+        efecto_sexo = rng.normal(0, escala * 0.02, size=len(sexos))
+        efecto_area[np.asarray(areas) == 'Total'] = 0
+        efecto_sexo[np.asarray(sexos) == 'Total'] = 0
+
+        filename = nombre.replace(' ', '').lower()
+        with EscritorTabla(directorio, filename) as escritor:
+            for inicio in range(0, n_paises, paises_por_chunk):
+                idx_pais = np.arange(inicio, min(n_paises, inicio + paises_por_chunk))
+                n = len(idx_pais) * celdas
+                pais = np.repeat(idx_pais, celdas)
+                y = np.tile(year_idx, len(idx_pais))
+
+                value = base[pais] + tendencia * y \
+                    + efecto_area[np.tile(area_idx, len(idx_pais))] \
+                    + efecto_sexo[np.tile(sexo_idx, len(idx_pais))] \
+                    + rng.normal(0, escala * 0.05, size=n)
+                value = np.round(np.clip(value, 0, None), 4)
+                if ratio_faltantes > 0:
+                    value[rng_faltantes.random(n) < ratio_faltantes] = np.nan
+
+                chunk = esquema.aplicar(pd.DataFrame({
+                    'year': years[y],
+                    'country_code': pd.Categorical.from_codes(pais, paises),
+                    'area': pd.Categorical.from_codes(np.tile(area_idx, len(idx_pais)), list(areas)),
+                    'value': value,
+                    'sex': pd.Categorical.from_codes(np.tile(sexo_idx, len(idx_pais)), list(sexos)),
+                }), filename)
+                escritor.escribir(chunk)
+
+        archivos[filename] = escritor.ruta
+        print(f"✓ {nombre}: {escritor.filas} registros")
+
+    return archivos
+
+def extraer_datos_iadb(incremental: bool = EXTRACT_INCREMENTAL, en_memoria: bool = False,
+                       sumidero: SumideroAsincrono | None = None):
     """
     Intenta extraer datos reales de IADB API
     Si falla, genera datos de ejemplo
+    En modo incremental solo descarga años nuevos o recursos modificados
+    Con `en_memoria` devuelve los DataFrames (la escritura a disco puede ir a `sumidero`);
+    si no, devuelve las rutas de los archivos raw
     """
     print("="*60)
     print("PASO 1: EXTRACCIÓN DE DATOS")
@@ -109,84 +124,248 @@ def extraer_datos_iadb():
     
     try:
         print("\nIntentando conectar a IADB API...")
-        url = "https://data.iadb.org/api/3/action/package_show"
-        params = {'id': 'social-indicators-of-latin-america-and-the-caribbean'}
-        csv_resources = get_resources(url, params)
-                
-        if csv_resources:
-            for resource in csv_resources:
-                df = get_data_from_api(resource['id'], limit=10000, filters=create_filter(year=2022))
-                filename = resource['name'].replace(' ', '').lower()
-                df.to_csv(RAW_DIR / f"{filename}.csv", index=False)
-            return {'filename': df}
-            
+        with ClienteHTTP() as cliente:
+            csv_resources = listar_recursos(cliente)
+
+            if csv_resources:
+                return descargar_recursos(csv_resources, cliente, incremental, en_memoria, sumidero)
+
     except Exception as e:
         print(f"\nNo se pudo conectar a IADB API: {e} {traceback.extract_tb(e.__traceback__)[-1].lineno}")
         print("  Generando datos de ejemplo en su lugar...\n")
-        return generar_datos_ejemplo()
-    
-def get_resources(url: str, params: dict[str, str]) -> list[dict[str, any]]:
-    response = requests.get(url, params=params)
-
-    if response.status_code >= HTTPStatus.OK and response.status_code < HTTPStatus.BAD_REQUEST:
-        has_succeeded = response.json()['success']
-        if has_succeeded:
-            result = response.json()['result']
-            resources = []
-            for r in result['resources']:
-                if r['is_indicator'] \
-                   and r['name'] in ALLOWED_NAMES \
-                   and r['format'].lower() == 'csv':
-                    resources.append({'id': r['id'], 'name': r['name']})
-            print(f"Number of resources: {len(resources)}")
-            return resources
+        archivos = generar_datos_ejemplo()
+        if en_memoria:
+            return {nombre: leer_tabla(RAW_DIR, nombre) for nombre in archivos}
+        return archivos
+
+def listar_recursos(cliente: ClienteHTTP) -> list[dict[str, any]]:
+    """Recursos CSV del paquete de indicadores (package_show)"""
+    url = f"{IADB_API_URL}/package_show"
+    params = {'id': IADB_PACKAGE_ID}
+    return get_resources(url, params, cliente)
+
+def extraer_recurso(resource: dict[str, any], cliente: ClienteHTTP, manifiesto: Manifiesto,
+                    incremental: bool = False, en_memoria: bool = False,
+                    sumidero: SumideroAsincrono | None = None) -> tuple[str, Path | pd.DataFrame, int | None, float | None]:
+    """
+    Descarga un recurso (en modo incremental, solo sus años pendientes)
+    El manifiesto se actualiza cuando el archivo raw ya está escrito
+    Devuelve (filename, ruta o DataFrame, filas, segundos); filas y segundos
+    son None si no había nada que descargar
+    """
+    filename = nombre_archivo(resource)
+    years, conservar = manifiesto.planificar(resource, existe_tabla(RAW_DIR, filename), YEARS, COUNTRIES) \
+        if incremental else (list(YEARS), False)
+    if not years:
+        salida = leer_tabla(RAW_DIR, filename) if en_memoria else ruta_tabla(RAW_DIR, filename)
+        return filename, salida, None, None
+
+    def al_guardar(ruta: Path):
+        manifiesto.registrar(resource, ruta.name, years, COUNTRIES, conservar, vigentes=YEARS)
+        manifiesto.guardar()
+
+    return descargar_recurso(resource, cliente, years, conservar,
+                             en_memoria=en_memoria, sumidero=sumidero, al_guardar=al_guardar)
+
+def descargar_recursos(resources: list[dict[str, any]], cliente: ClienteHTTP,
+                       incremental: bool = False, en_memoria: bool = False,
+                       sumidero: SumideroAsincrono | None = None) -> dict[str, Path | pd.DataFrame]:
+    """Descarga los recursos en paralelo (hasta EXTRACT_MAX_WORKERS a la vez)"""
+    manifiesto = Manifiesto()
+    datos, filas, tiempos = {}, {}, {}
+
+    print(f"Descargando {len(resources)} recursos con {EXTRACT_MAX_WORKERS} workers...")
+    inicio = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=EXTRACT_MAX_WORKERS) as pool:
+        futuros = [pool.submit(extraer_recurso, r, cliente, manifiesto, incremental, en_memoria, sumidero)
+                   for r in resources]
+        for futuro in as_completed(futuros):
+            filename, salida, n_filas, segundos = futuro.result()
+            datos[filename] = salida
+            if segundos is not None:
+                filas[filename] = n_filas
+                tiempos[filename] = segundos
+
+    total = time.perf_counter() - inicio
+    if incremental:
+        print(f"Modo incremental: {len(tiempos)} de {len(resources)} recursos con años nuevos o cambios")
+    if tiempos:
+        print("\nTiempos por recurso:")
+        for filename, segundos in sorted(tiempos.items(), key=lambda t: -t[1]):
+            print(f"  ✓ {filename}: {filas[filename]} filas en {segundos:.2f}s")
+        print(f"  Total: {total:.2f}s (descarga más lenta: {max(tiempos.values()):.2f}s)")
+    return datos
+
+def nombre_archivo(resource: dict[str, any]) -> str:
+    return resource['name'].replace(' ', '').lower()
+
+def descargar_recurso(resource: dict[str, any], cliente: ClienteHTTP,
+                      years: list[str] = YEARS, conservar: bool = False,
+                      en_memoria: bool = False, sumidero: SumideroAsincrono | None = None,
+                      al_guardar: Callable[[Path], None] | None = None) -> tuple[str, Path | pd.DataFrame, int, float]:
+    """
+    Descarga un recurso página a página
+    - por defecto escribe cada página en RAW_DIR a medida que llega (memoria constante)
+    - con `en_memoria` arma el DataFrame y lo persiste (o lo encola en `sumidero`)
+    Con `conservar`, mantiene las filas existentes de los años que no se descargan
+    Devuelve (archivo, ruta o DataFrame, filas, segundos)
+    """
+    inicio = time.perf_counter()
+    filename = nombre_archivo(resource)
+    with metricas.span(f"descarga:{filename}", years=len(years)):
+        salida, n_filas = _descargar_recurso(resource, cliente, filename, years, conservar,
+                                             en_memoria, sumidero, al_guardar)
+
+    print(f"Download {resource['id']} completed successfully")
+    return filename, salida, n_filas, time.perf_counter() - inicio
+
+def _descargar_recurso(resource: dict[str, any], cliente: ClienteHTTP, filename: str,
+                       years: list[str], conservar: bool, en_memoria: bool,
+                       sumidero: SumideroAsincrono | None,
+                       al_guardar: Callable[[Path], None] | None) -> tuple[Path | pd.DataFrame, int]:
+    chunks = _chunks_recurso(resource, cliente, years, conservar)
+
+    if en_memoria:
+        partes = list(chunks)
+        # Las categorías de cada página difieren: el concat las deja como texto y se vuelven a tipar
+        salida = esquema.aplicar(pd.concat(partes, ignore_index=True), filename) if partes else pd.DataFrame(columns=COLUMNS)
+        n_filas = len(salida)
+        if sumidero is not None:
+            sumidero.escribir(salida, RAW_DIR, filename, al_terminar=al_guardar)
         else:
-            raise Exception("No se encontraron archivos CSV")
+            ruta = escribir_tabla(salida, RAW_DIR, filename)
+            if al_guardar is not None:
+                al_guardar(ruta)
     else:
-        raise Exception(f"Error accessing API. Code {response.status_code}")
+        with EscritorTabla(RAW_DIR, filename, columnas=COLUMNS) as escritor:
+            for chunk in chunks:
+                escritor.escribir(chunk)
+        salida, n_filas = escritor.ruta, escritor.filas
+        if al_guardar is not None:
+            al_guardar(salida)
+    return salida, n_filas
 
+def _chunks_recurso(resource: dict[str, any], cliente: ClienteHTTP, years: list[str], conservar: bool):
+    """Filas vigentes que ya estaban en el raw (si `conservar`) seguidas de las páginas nuevas"""
+    filename = nombre_archivo(resource)
+    if conservar:
+        for chunk in iterar_tabla(RAW_DIR, filename, filas=EXTRACT_PAGE_SIZE):
+            year = chunk['year'].astype(str)
+            yield esquema.aplicar(chunk[year.isin(YEARS) & ~year.isin(years) & chunk['country_code'].isin(COUNTRIES)],
+                                  filename)
+    yield from iterar_paginas(resource['id'], filters=create_filter(years=years), cliente=cliente,
+                              version=resource.get('last_modified'), indicador=filename)
     
-def get_data_from_api(resource_id: str, limit: int = 1000, filters: list[dict[str, str]] = []):
-    filter_str = parse_filter(filters)
-    sort = "year%20desc"
-
-    url = f"https://data.iadb.org/api/action/datastore_search?resource_id={resource_id}&limit={limit}&filters={filter_str}&distinct=True&include_total=False&sort={sort}"
-    response = requests.get(url)
-
-    if response.status_code >= HTTPStatus.OK and response.status_code < HTTPStatus.BAD_REQUEST:
-        result = response.json().get('result')
-        data = pd.DataFrame(result['records'])[FIELDS]
-        print(f"Download {resource_id} completed successfully")
-        data = data[data['isoalpha3'].isin(COUNTRIES)]
-        data = data[data['year'].isin(YEARS)]
-        data.rename(columns={'isoalpha3': 'country_code'}, inplace=True)
-        return data
+def get_resources(url: str, params: dict[str, str], cliente: ClienteHTTP) -> list[dict[str, any]]:
+    # package_show es pequeño y trae los last_modified: se revalida siempre (If-None-Match)
+    response = cliente.get_json(url, clave=f"package_show|{params['id']}", params=params, revalidar=True)
+
+    if response['success']:
+        result = response['result']
+        resources = []
+        for r in result['resources']:
+            if r['is_indicator'] \
+               and r['name'] in ALLOWED_NAMES \
+               and r['format'].lower() == 'csv':
+                resources.append({'id': r['id'], 'name': r['name'], 'last_modified': r.get('last_modified')})
+        print(f"Number of resources: {len(resources)}")
+        return resources
     else:
-        raise Exception(f"Code {response.status_code}: {response.text}")
+        raise Exception("No se encontraron archivos CSV")
+
+def iterar_paginas(resource_id: str, filters: list[dict[str, any]] = [], cliente: ClienteHTTP = None,
+                   limit: int = EXTRACT_PAGE_SIZE, version: str | None = None, indicador: str | None = None):
+    """
+    Recorre datastore_search página a página (offset / _links.next)
+    Genera un DataFrame por página, ya filtrado y con las columnas finales
+    `version` (last_modified del recurso) invalida las páginas en caché si cambió
+    `indicador` (nombre del archivo raw) fija el tipo de la columna value
+    """
+    filter_str = parse_filter(filters)
+    sort = "year%20desc%2C_id"
+
+    url = f"{IADB_API_URL}/datastore_search?resource_id={resource_id}&limit={limit}&offset=0&filters={filter_str}&distinct=True&include_total=False&sort={sort}"
+    propio = cliente is None
+    if propio:
+        cliente = ClienteHTTP()
+
+    offset = 0
+    try:
+        while url:
+            clave = f"{resource_id}|{filter_str}|{limit}|{offset}"
+            result = cliente.get_json(url, clave=clave, version=version).get('result')
+            records = result['records']
+            if not records:
+                break
+
+            # Solo se materializan las columnas necesarias de cada página
+            page = pd.DataFrame(records, columns=FIELDS)
+            # Los filtros ya van al servidor; esto solo protege contra valores inesperados
+            page = page[page['isoalpha3'].isin(COUNTRIES) & page['year'].astype(str).isin(YEARS)]
+            page = page.rename(columns={'isoalpha3': 'country_code'})
+            # Tipos del esquema para que todos los chunks (y todas las etapas) coincidan
+            page['value'] = pd.to_numeric(page['value'], errors='coerce')
+            # area y sex faltantes (None) quedan como NaN en la categórica, no como el texto 'None'
+            yield esquema.aplicar(page, indicador)
+
+            if len(records) < limit:
+                break
+            offset += limit
+            siguiente = result.get('_links', {}).get('next')
+            url = urljoin(IADB_API_URL, siguiente) if siguiente else None
+    finally:
+        if propio:
+            cliente.close()
+
+def get_data_from_api(resource_id: str, limit: int = EXTRACT_PAGE_SIZE, filters: list[dict[str, any]] = [], cliente: ClienteHTTP = None):
+    """Descarga todas las páginas de un recurso en un solo DataFrame"""
+    pages = list(iterar_paginas(resource_id, filters=filters, cliente=cliente, limit=limit))
+    if not pages:
+        return pd.DataFrame(columns=COLUMNS)
+    return esquema.aplicar(pd.concat(pages, ignore_index=True))
     
-def parse_filter(filters: list[dict[str, str]] = []) -> str:
-    filter_str = "%7B"
+def parse_filter(filters: list[dict[str, any]] = []) -> str:
+    """Codifica los filtros como objeto JSON para la URL (las listas se filtran con IN)"""
+    filtros = {}
     for f in filters:
-        key, value = next(iter(f.items()))
-        if isinstance(value, str):
-            value = f"%22{value}%22"
-        filter_str += f"%22{key}%22%3A{value}%2C"
-    filter_str = filter_str[:-3]
-    filter_str += "%7D"
-    return filter_str
+        filtros.update(f)
+    return quote(json.dumps(filtros, separators=(',', ':')))
     
-def create_filter(year: int) -> list[dict[str, str]]:
+def create_filter(years: list[str] = YEARS, countries: list[str] = COUNTRIES) -> list[dict[str, any]]:
     filters = [{'education_level': 'Total'}
              , {'ethnicity': 'Total'}
              , {'language': 'Total'}
              , {'disability': 'Total'}
              , {'migration': 'Total'}
              , {'management': 'Total'}
-             , {'quintile': 'Total'}]
+             , {'quintile': 'Total'}
+             , {'isoalpha3': list(countries)}
+             , {'year': list(years)}]
     return filters
 
 if __name__ == '__main__':
-    datos = extraer_datos_iadb()
+    import argparse
+    parser = argparse.ArgumentParser(description="Extracción de datos del IADB")
+    parser.add_argument('--ejemplo', action='store_true', help="Solo generar datos sintéticos")
+    parser.add_argument('--paises', type=int, default=len(COUNTRIES))
+    parser.add_argument('--años', default='2010-2023', help="Rango de años, ej. 2000-2023")
+    parser.add_argument('--areas', default='Total', help="Lista separada por comas")
+    parser.add_argument('--sexos', default='Total', help="Lista separada por comas")
+    parser.add_argument('--indicadores', type=int, default=len(ALLOWED_NAMES))
+    parser.add_argument('--faltantes', type=float, default=0.0, help="Proporción de valores nulos")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk', type=int, default=None, help="Filas por bloque de escritura")
+    args = parser.parse_args()
+
+    if args.ejemplo:
+        desde, hasta = (int(a) for a in args.años.split('-'))
+        datos = generar_datos_ejemplo(n_paises=args.paises, años=(desde, hasta),
+                                      areas=tuple(args.areas.split(',')), sexos=tuple(args.sexos.split(',')),
+                                      ratio_faltantes=args.faltantes, n_indicadores=args.indicadores,
+                                      seed=args.seed, filas_por_chunk=args.chunk)
+    else:
+        datos = extraer_datos_iadb()
     print("\n" + "="*60)
     print("EXTRACCIÓN COMPLETADA")
     print("="*60)
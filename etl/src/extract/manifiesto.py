@@ -0,0 +1,59 @@
+"""
+Manifiesto de la extracción incremental
+Registra, por recurso, su last_modified en package_show y los años (con sus
+países) que ya están en el archivo raw, para descargar solo lo que falta o cambió
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+from config import EXTRACT_MANIFEST
+
+
+class Manifiesto:
+    def __init__(self, ruta: Path = EXTRACT_MANIFEST):
+        self.ruta = Path(ruta)
+        self._lock = threading.Lock()
+        try:
+            self.recursos = json.loads(self.ruta.read_text()).get('resources', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.recursos = {}
+
+    def planificar(self, resource: dict[str, any], existe_raw: bool,
+                   years: list[str], countries: list[str]) -> tuple[list[str], bool]:
+        """
+        Devuelve (años a descargar, conservar_existentes)
+        - recurso nuevo, modificado o sin archivo raw: todos los años, sin conservar
+        - si no: solo los años que faltan o a los que les faltan países
+        """
+        entrada = self.recursos.get(resource['id'])
+        if entrada is None \
+           or entrada.get('last_modified') != resource.get('last_modified') \
+           or not existe_raw:
+            return list(years), False
+
+        pendientes = [y for y in years
+                      if not set(countries) <= set(entrada['years'].get(y, []))]
+        return pendientes, True
+
+    def registrar(self, resource: dict[str, any], archivo: str, years: list[str],
+                  countries: list[str], conservar: bool, vigentes: list[str]):
+        """Anota los años descargados; `vigentes` son los años que quedan en el archivo"""
+        with self._lock:
+            anterior = self.recursos.get(resource['id'], {}).get('years', {}) if conservar else {}
+            nuevos = {y: sorted(set(paises) & set(countries)) for y, paises in anterior.items() if y in vigentes}
+            nuevos.update({y: sorted(countries) for y in years})
+            self.recursos[resource['id']] = {
+                'name': resource['name'],
+                'archivo': archivo,
+                'last_modified': resource.get('last_modified'),
+                'years': dict(sorted(nuevos.items())),
+            }
+
+    def guardar(self):
+        with self._lock:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.ruta.with_suffix('.json.tmp')
+            tmp.write_text(json.dumps({'resources': self.recursos}, indent=2, ensure_ascii=False))
+            os.replace(tmp, self.ruta)
@@ -0,0 +1,80 @@
+"""
+Ejecución por fragmentos de países
+El join y la deduplicación de transform y el estado suma/conteo de analytics
+solo dependen de las filas de cada país: con SHARD_WORKERS > 0 se reparten
+los países en fragmentos y cada fragmento se procesa en un pool de procesos
+El proceso principal hace la reducción global (concatenación y orden, medias
+por año, rankings entre países), que trabaja sobre datos ya agregados
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+import numpy as np
+from config import SHARD_WORKERS
+from src import metricas
+
+_pools: dict[int, ProcessPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def repartir(paises: list[str], fragmentos: int) -> list[list[str]]:
+    """
+    Fragmentos contiguos de la lista ordenada de países: concatenar los
+    resultados de cada fragmento conserva el orden por país
+    """
+    paises = sorted(paises)
+    if not paises:
+        return []
+    return [list(p) for p in np.array_split(np.asarray(paises, dtype=object), min(fragmentos, len(paises)))
+            if len(p)]
+
+
+def pool(workers: int = SHARD_WORKERS) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido por transform y analytics (arrancar cada proceso
+    cuesta importar pandas otra vez); se cierra al salir del programa
+    Los procesos se crean con 'spawn': el pipeline puede llegar aquí desde un
+    hilo del planificador, y un fork con otros hilos activos no es seguro
+    """
+    with _lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                  mp_context=multiprocessing.get_context('spawn'))
+        return _pools[workers]
+
+
+def cerrar():
+    with _lock:
+        for ejecutor in _pools.values():
+            ejecutor.shutdown(wait=True)
+        _pools.clear()
+
+
+atexit.register(cerrar)
+
+
+def _correr(funcion: Callable[..., Any], args: tuple) -> tuple[Any, dict[str, int]]:
+    """En el proceso hijo: el resultado y sus contadores (filas, bytes), que se suman en el padre"""
+    metricas.reiniciar()
+    return funcion(*args), metricas.totales()
+
+
+def ejecutar(funcion: Callable[..., Any], argumentos: list[tuple], nombre: str,
+             workers: int = SHARD_WORKERS) -> list[Any]:
+    """
+    `funcion(*args)` para cada fragmento en el pool de procesos; los resultados
+    vuelven en el orden de `argumentos`
+    """
+    with metricas.span(f"fragmentos:{nombre}", fragmentos=len(argumentos), procesos=workers):
+        if len(argumentos) <= 1:
+            return [funcion(*args) for args in argumentos]
+        futuros = [pool(workers).submit(_correr, funcion, args) for args in argumentos]
+        resultados = []
+        for futuro in futuros:
+            resultado, contadores = futuro.result()
+            metricas.contar(**contadores)
+            resultados.append(resultado)
+        return resultados
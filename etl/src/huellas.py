@@ -0,0 +1,61 @@
+"""
+Huellas (fingerprints) de las etapas del pipeline
+La huella de una tarea resume sus archivos de entrada, el código de los módulos
+que la ejecutan y los valores de configuración que usa: si coincide con la de
+la última ejecución exitosa (y sus salidas siguen intactas) la tarea se salta
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from pathlib import Path
+
+_hashes_archivos: dict[tuple[str, int, int], str] = {}
+_lock = threading.Lock()
+
+
+def hash_archivo(ruta: Path) -> str | None:
+    """sha256 del contenido (None si no existe); se memoriza por ruta, tamaño y mtime"""
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    clave = (str(ruta), info.st_size, info.st_mtime_ns)
+    with _lock:
+        if clave in _hashes_archivos:
+            return _hashes_archivos[clave]
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    with _lock:
+        _hashes_archivos[clave] = h.hexdigest()
+    return _hashes_archivos[clave]
+
+
+def fuente_modulo(nombre: str) -> Path:
+    """Archivo fuente de un módulo, sin importarlo (la huella no debe cargar pandas ni sqlalchemy)"""
+    spec = importlib.util.find_spec(nombre)
+    if spec is None or spec.origin is None:
+        raise ModuleNotFoundError(f"No se encontró el módulo {nombre}")
+    return Path(spec.origin)
+
+
+def huella(archivos: list[Path] = (), modulos: list[str] = (), valores: dict | None = None) -> str:
+    """Huella de una tarea: contenido de `archivos`, código de `modulos` (por nombre) y `valores` de configuración"""
+    partes = {
+        'archivos': {Path(r).name: hash_archivo(r) for r in archivos},
+        'codigo': {m: hash_archivo(fuente_modulo(m)) for m in modulos},
+        'valores': valores or {},
+    }
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hashes_salidas(salidas: list[Path]) -> dict[str, str | None]:
+    return {str(r): hash_archivo(r) for r in salidas}
+
+
+def salidas_intactas(registradas: dict[str, str | None]) -> bool:
+    """Las salidas registradas existen y no cambiaron desde que se escribieron"""
+    return all(h is not None and hash_archivo(Path(r)) == h for r, h in registradas.items())
@@ -2,28 +2,463 @@
 PASO 4: CARGA A POSTGRESQL
 Carga datos procesados y KPIs a la base de datos
 """
+import io
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy import create_engine, text
-from config import DATABASE_URL, PROCESSED_DIR, ANALYTICS_DIR
+from sqlalchemy.exc import OperationalError
+from config import (DATABASE_URL, PROCESSED_DIR, ANALYTICS_DIR, LOAD_COPY_CHUNK, LOAD_MAX_WORKERS,
+                    LOAD_INCREMENTAL, LOAD_PARTITIONED, DB_WAIT_TIMEOUT)
+from src import metricas
+from src.esquema import aplicar, tipo_postgres
+from src.storage import existe_tabla, hashes_particiones, leer_tabla, listar_tablas
+from src.load.nombres import TABLA_CARGAS, identificador
+from src.load.vistas import actualizar_vistas, crear_vistas, eliminar_vistas, vistas_afectadas
 import time
 
-def cargar_a_postgres():
-    """Carga todos los CSVs a PostgreSQL"""
-    print("="*60)
-    print("PASO 4: CARGA A POSTGRESQL")
-    print("="*60)
-    
-    # Conectar a PostgreSQL
+def iterar_csv(df: pd.DataFrame, filas: int = LOAD_COPY_CHUNK):
+    """Bloques del DataFrame ya serializados como CSV en memoria"""
+    for inicio in range(0, len(df), filas):
+        buffer = io.StringIO()
+        bloque = df.iloc[inicio:inicio + filas]
+        bloque.to_csv(buffer, index=False, header=False)
+        metricas.contar(filas_salida=len(bloque), bytes_escritos=buffer.tell())
+        buffer.seek(0)
+        yield buffer
+
+# Índices de cada tabla: (nombre, columnas); se crean en staging antes del swap
+INDICES_TABLAS = {
+    'unified_data': [('idx_unified_country', ['country_code']),
+                     ('idx_unified_year', ['year'])],
+    'kpi_pais_año': [('idx_kpi_pais_año_country_year', ['country_code', 'year'])],
+    'kpi_comparacion_regional': [('idx_kpi_comparacion_regional_country_year', ['country_code', 'year'])],
+}
+
+# Clave primaria de cada tabla (las tablas sin clave siempre se reemplazan completas)
+CLAVES_TABLAS = {
+    'unified_data': ['country_code', 'year', 'area', 'sex'],
+    'kpi_pais_año': ['country_code', 'year', 'area', 'sex'],
+    'kpi_comparacion_regional': ['country_code', 'year', 'area', 'sex'],
+    'kpi_promedios_pais': ['country_code'],
+    'kpi_evolucion_temporal': ['year'],
+}
+
+# Hash del contenido de cada partición cargada (año, o '*' si la tabla no tiene year en la clave)
+TABLA_ESTADO = 'etl_particiones'
+
+# Tablas que se crean particionadas por rango de year con LOAD_PARTITIONED (una partición por año)
+TABLAS_PARTICIONADAS = ['unified_data', 'kpi_pais_año', 'kpi_comparacion_regional']
+
+SUFIJO_STAGING = '__staging'
+
+def nombre_staging(nombre: str) -> str:
+    return f"{nombre}{SUFIJO_STAGING}"
+
+def nombre_particion(nombre: str, year) -> str:
+    return f"{nombre}_y{int(year)}"
+
+def particionar(nombre: str, df: pd.DataFrame) -> bool:
+    return LOAD_PARTITIONED and nombre in TABLAS_PARTICIONADAS and 'year' in df.columns
+
+def particiones_de(cur, tabla: str) -> list[str]:
+    """Particiones (tablas hijas) de una tabla particionada"""
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass", (identificador(tabla),))
+    return [fila[0] for fila in cur.fetchall()]
+
+def publicar_particion(cur, staging: str):
+    """Quita el sufijo staging a una partición y a sus índices"""
+    cur.execute("SELECT c.relname FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid "
+                "WHERE x.indrelid = %s::regclass", (identificador(staging),))
+    for (indice,) in cur.fetchall():
+        cur.execute(f"ALTER INDEX {identificador(indice)} "
+                    f"RENAME TO {identificador(indice.replace(SUFIJO_STAGING, ''))}")
+    cur.execute(f"ALTER TABLE {identificador(staging)} "
+                f"RENAME TO {identificador(staging[:-len(SUFIJO_STAGING)])}")
+
+def preparar_tabla(engine, df: pd.DataFrame, nombre_tabla: str) -> float:
+    """
+    Crea `<tabla>__staging`, la llena con COPY FROM STDIN (psycopg2) y le crea
+    sus índices, usando una conexión propia del pool
+    Con LOAD_PARTITIONED las tablas de TABLAS_PARTICIONADAS se crean particionadas
+    por year, con una partición `<tabla>_y<año>__staging` por año
+    La tabla publicada no se toca hasta publicar_tablas()
+    Devuelve los segundos que tomó
+    """
+    inicio = time.perf_counter()
+    staging = nombre_staging(nombre_tabla)
+    tabla = identificador(staging)
+    columnas = ', '.join(identificador(c) for c in df.columns)
+    definicion = ', '.join(f"{identificador(c)} {tipo_postgres(df[c])}" for c in df.columns)
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {tabla}")
+            if particionar(nombre_tabla, df):
+                cur.execute(f"CREATE TABLE {tabla} ({definicion}) PARTITION BY RANGE (year)")
+                for year in sorted(df['year'].unique()):
+                    particion = identificador(nombre_staging(nombre_particion(nombre_tabla, year)))
+                    cur.execute(f"CREATE TABLE {particion} PARTITION OF {tabla} "
+                                f"FOR VALUES FROM ({int(year)}) TO ({int(year) + 1})")
+            else:
+                cur.execute(f"CREATE TABLE {tabla} ({definicion})")
+            with metricas.span(f"copy:{nombre_tabla}"):
+                for buffer in iterar_csv(df):
+                    cur.copy_expert(f"COPY {tabla} ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer)
+            claves = claves_tabla(nombre_tabla, df)
+            if claves:
+                cur.execute(f"ALTER TABLE {tabla} ADD CONSTRAINT {identificador(nombre_staging('pk_' + nombre_tabla))} "
+                            f"PRIMARY KEY ({', '.join(identificador(c) for c in claves)})")
+            for indice, columnas_indice in INDICES_TABLAS.get(nombre_tabla, []):
+                if all(c in df.columns for c in columnas_indice):
+                    cur.execute(f"CREATE INDEX {identificador(nombre_staging(indice))} ON {tabla} "
+                                f"({', '.join(identificador(c) for c in columnas_indice)})")
+            cur.execute(f"ANALYZE {tabla}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    segundos = time.perf_counter() - inicio
+    print(f"  ✓ Tabla '{nombre_tabla}': {len(df)} filas en {segundos:.2f}s "
+          f"({len(df) / max(segundos, 1e-9):,.0f} filas/s)")
+    return segundos
+
+def publicar_tablas(engine, resultados: dict[str, tuple[str, dict[str, str]]]):
+    """
+    Publica en una sola transacción todo lo que dejaron preparado las cargas:
+    - 'staging': reemplaza la tabla por su versión staging
+    - 'upsert': aplica las filas de `<tabla>__staging` a la tabla publicada
+    - 'particiones': intercambia las particiones de los años cambiados
+    y registra los hashes de sus particiones
+    Las vistas materializadas que leen de tablas reemplazadas se recrean en la misma transacción
+    """
+    en_staging = [nombre for nombre, (accion, _) in resultados.items() if accion == 'staging']
+    vistas = vistas_afectadas(en_staging)
+    with engine.begin() as conn:
+        crear_tabla_estado(conn)
+        eliminar_vistas(conn, vistas)
+        cur = conn.connection.cursor()
+        for nombre, (accion, hashes) in resultados.items():
+            if accion == 'upsert':
+                aplicar_upsert(cur, nombre, hashes)
+            elif accion == 'particiones':
+                intercambiar_particiones(cur, nombre, hashes)
+            elif accion == 'staging':
+                tabla = identificador(nombre)
+                conn.execute(text(f"DROP TABLE IF EXISTS {tabla}"))
+                conn.execute(text(f"ALTER TABLE {identificador(nombre_staging(nombre))} RENAME TO {tabla}"))
+                for indice in ['pk_' + nombre] + [i for i, _ in INDICES_TABLAS.get(nombre, [])]:
+                    conn.execute(text(f"ALTER INDEX IF EXISTS {identificador(nombre_staging(indice))} "
+                                      f"RENAME TO {identificador(indice)}"))
+                for particion in particiones_de(cur, nombre):
+                    if particion.endswith(SUFIJO_STAGING):
+                        publicar_particion(cur, particion)
+                conn.execute(text(f"DELETE FROM {TABLA_ESTADO} WHERE tabla = :tabla"), {'tabla': nombre})
+                guardar_hashes(conn, nombre, hashes)
+        crear_vistas(conn, vistas)
+
+def descartar_staging(engine, nombres: list[str]):
+    """Borra las tablas staging (y las particiones sueltas de una carga por particiones)"""
+    with engine.begin() as conn:
+        sueltas = [t for t in conn.execute(text(
+            "SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename LIKE '%\\_\\_staging'"
+        )).scalars() if any(t.startswith(f"{nombre}_y") for nombre in nombres)]
+        for tabla in [nombre_staging(nombre) for nombre in nombres] + sueltas:
+            conn.execute(text(f"DROP TABLE IF EXISTS {identificador(tabla)}"))
+
+def claves_tabla(nombre: str, df: pd.DataFrame) -> list[str]:
+    """Clave primaria declarada, si todas sus columnas están en el DataFrame"""
+    claves = CLAVES_TABLAS.get(nombre, [])
+    return claves if claves and all(c in df.columns for c in claves) else []
+
+def crear_tabla_estado(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {TABLA_ESTADO} (
+            tabla TEXT NOT NULL,
+            particion TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            cargado TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (tabla, particion)
+        )
+    """))
+
+def guardar_hashes(conn, nombre: str, hashes: dict[str, str]):
+    for particion, valor in hashes.items():
+        conn.execute(text(f"""
+            INSERT INTO {TABLA_ESTADO} (tabla, particion, hash) VALUES (:tabla, :particion, :hash)
+            ON CONFLICT (tabla, particion) DO UPDATE SET hash = EXCLUDED.hash, cargado = now()
+        """), {'tabla': nombre, 'particion': particion, 'hash': valor})
+
+def registrar_carga(engine, tablas: list[str]) -> int:
+    """Nueva generación de datos publicados (al final de la carga, con las vistas ya actualizadas)"""
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {TABLA_CARGAS} (
+                generacion BIGSERIAL PRIMARY KEY,
+                tablas TEXT[] NOT NULL,
+                cargado TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """))
+        return conn.execute(text(f"INSERT INTO {TABLA_CARGAS} (tablas) VALUES (:tablas) RETURNING generacion"),
+                            {'tablas': tablas}).scalar()
+
+def leer_estado_bd(engine) -> tuple[dict[str, dict[str, str]], dict[str, list[str]], dict[str, list[str]], set[str]]:
+    """
+    Hashes registrados, columnas de cada tabla publicada, columnas de su clave
+    primaria y tablas particionadas
+    """
+    with engine.begin() as conn:
+        crear_tabla_estado(conn)
+        hashes = {}
+        for tabla, particion, valor in conn.execute(text(f"SELECT tabla, particion, hash FROM {TABLA_ESTADO}")):
+            hashes.setdefault(tabla, {})[particion] = valor
+        columnas = {}
+        for tabla, columna in conn.execute(text("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = 'public' ORDER BY table_name, ordinal_position
+        """)):
+            columnas.setdefault(tabla, []).append(columna)
+        pks = {}
+        for tabla, columna in conn.execute(text("""
+            SELECT tc.table_name, kcu.column_name
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+            WHERE tc.table_schema = 'public' AND tc.constraint_type = 'PRIMARY KEY'
+            ORDER BY tc.table_name, kcu.ordinal_position
+        """)):
+            pks.setdefault(tabla, []).append(columna)
+        particionadas = set(conn.execute(text("""
+            SELECT c.relname FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public'
+        """)).scalars())
+    return hashes, columnas, pks, particionadas
+
+def hashes_publicados(cur, nombre: str) -> dict[str, str]:
+    """Hashes registrados de una tabla, leídos dentro de la transacción de publicación"""
+    cur.execute(f"SELECT particion, hash FROM {TABLA_ESTADO} WHERE tabla = %s", (nombre,))
+    return dict(cur.fetchall())
+
+def estado_tabla(engine, nombre: str) -> dict[str, str] | None:
+    """
+    Lo que hay publicado de una tabla: los hashes registrados de sus particiones,
+    o None si la tabla no existe (run_all vuelve a cargarla si no coincide con lo cargado)
+    """
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:tabla)"), {'tabla': identificador(nombre)}).scalar() is None:
+            return None
+        if conn.execute(text(f"SELECT to_regclass('{TABLA_ESTADO}')")).scalar() is None:
+            return {}
+        return dict(conn.execute(text(f"SELECT particion, hash FROM {TABLA_ESTADO} WHERE tabla = :tabla"),
+                                 {'tabla': nombre}).all())
+
+def upsert_tabla(engine, df: pd.DataFrame, nombre_tabla: str, claves: list[str],
+                 hashes: dict[str, str], anteriores: dict[str, str]) -> float:
+    """
+    Prepara el upsert de las particiones que cambiaron: sus filas van por COPY a
+    `<tabla>__staging` (UNLOGGED, con las columnas de la tabla publicada)
+    La tabla publicada no se toca hasta publicar_tablas() (aplicar_upsert)
+    """
+    inicio = time.perf_counter()
+    cambiadas = [p for p, h in hashes.items() if anteriores.get(p) != h]
+    eliminadas = [p for p in anteriores if p not in hashes]
+    if 'year' in claves:
+        df = df[df['year'].astype(str).isin(cambiadas)]
+
+    staging = identificador(nombre_staging(nombre_tabla))
+    columnas = ', '.join(identificador(c) for c in df.columns)
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            cur.execute(f"CREATE UNLOGGED TABLE {staging} (LIKE {identificador(nombre_tabla)})")
+            with metricas.span(f"copy:{nombre_tabla}", particiones=len(cambiadas)):
+                for buffer in iterar_csv(df):
+                    cur.copy_expert(f"COPY {staging} ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cur.execute(f"ANALYZE {staging}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    segundos = time.perf_counter() - inicio
+    print(f"  ✓ Tabla '{nombre_tabla}': {len(df)} filas preparadas para upsert "
+          f"({len(cambiadas)} particiones cambiadas, {len(eliminadas)} eliminadas) en {segundos:.2f}s "
+          f"({len(df) / max(segundos, 1e-9):,.0f} filas/s)")
+    return segundos
+
+def aplicar_upsert(cur, nombre_tabla: str, hashes: dict[str, str]):
+    """
+    Dentro de la transacción de publicación: INSERT ... ON CONFLICT DO UPDATE
+    desde `<tabla>__staging`, borra las filas de las particiones cambiadas que ya
+    no vienen (y las particiones eliminadas) y actualiza sus hashes
+    """
+    anteriores = hashes_publicados(cur, nombre_tabla)
+    cambiadas = [p for p, h in hashes.items() if anteriores.get(p) != h]
+    eliminadas = [p for p in anteriores if p not in hashes]
+    claves = CLAVES_TABLAS[nombre_tabla]
+
+    tabla = identificador(nombre_tabla)
+    staging = identificador(nombre_staging(nombre_tabla))
+    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' "
+                "AND table_name = %s ORDER BY ordinal_position", (nombre_staging(nombre_tabla),))
+    nombres = [fila[0] for fila in cur.fetchall()]
+    columnas = ', '.join(identificador(c) for c in nombres)
+    conflicto = ', '.join(identificador(c) for c in claves)
+    no_claves = [c for c in nombres if c not in claves]
+    actualizar = ', '.join(f"{identificador(c)} = EXCLUDED.{identificador(c)}" for c in no_claves)
+    misma_clave = ' AND '.join(f"t.{identificador(c)} = s.{identificador(c)}" for c in claves)
+
+    cur.execute(f"INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM {staging} "
+                f"ON CONFLICT ({conflicto}) "
+                + (f"DO UPDATE SET {actualizar}" if actualizar else "DO NOTHING"))
+    # Filas que desaparecieron de las particiones cambiadas
+    filtro = "t.year = ANY(%s)" if 'year' in claves else "TRUE"
+    parametros = ([[int(p) for p in cambiadas]],) if 'year' in claves else ()
+    cur.execute(f"DELETE FROM {tabla} t WHERE {filtro} "
+                f"AND NOT EXISTS (SELECT 1 FROM {staging} s WHERE {misma_clave})", *parametros)
+    if eliminadas and 'year' in claves:
+        cur.execute(f"DELETE FROM {tabla} WHERE year = ANY(%s)", ([int(p) for p in eliminadas],))
+    cur.execute(f"DROP TABLE {staging}")
+    for particion in eliminadas:
+        cur.execute(f"DELETE FROM {TABLA_ESTADO} WHERE tabla = %s AND particion = %s", (nombre_tabla, particion))
+    for particion in cambiadas:
+        cur.execute(f"""
+            INSERT INTO {TABLA_ESTADO} (tabla, particion, hash) VALUES (%s, %s, %s)
+            ON CONFLICT (tabla, particion) DO UPDATE SET hash = EXCLUDED.hash, cargado = now()
+        """, (nombre_tabla, particion, hashes[particion]))
+
+def reemplazar_particiones(engine, df: pd.DataFrame, nombre_tabla: str,
+                           hashes: dict[str, str], anteriores: dict[str, str]) -> float:
+    """
+    Carga incremental de una tabla particionada por year: cada año que cambió se
+    construye aparte (COPY, clave e índices) como `<tabla>_y<año>__staging`
+    El intercambio por las particiones anteriores va en publicar_tablas()
+    (intercambiar_particiones); las demás particiones no se tocan
+    """
+    inicio = time.perf_counter()
+    cambiadas = sorted(int(p) for p, h in hashes.items() if anteriores.get(p) != h)
+    eliminadas = sorted(int(p) for p in anteriores if p not in hashes)
+
+    tabla = identificador(nombre_tabla)
+    columnas = ', '.join(identificador(c) for c in df.columns)
+    claves = claves_tabla(nombre_tabla, df)
+    filas = 0
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            for year in cambiadas:
+                staging = identificador(nombre_staging(nombre_particion(nombre_tabla, year)))
+                df_year = df[df['year'] == year]
+                cur.execute(f"DROP TABLE IF EXISTS {staging}")
+                cur.execute(f"CREATE TABLE {staging} (LIKE {tabla} INCLUDING DEFAULTS)")
+                with metricas.span(f"copy:{nombre_tabla}", year=year):
+                    for buffer in iterar_csv(df_year):
+                        cur.copy_expert(f"COPY {staging} ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer)
+                # El CHECK evita que ATTACH recorra la partición para validarla
+                cur.execute(f"ALTER TABLE {staging} ADD CONSTRAINT ck_year "
+                            f"CHECK (year >= {year} AND year < {year + 1})")
+                if claves:
+                    cur.execute(f"ALTER TABLE {staging} ADD PRIMARY KEY "
+                                f"({', '.join(identificador(c) for c in claves)})")
+                for _, columnas_indice in INDICES_TABLAS.get(nombre_tabla, []):
+                    if all(c in df.columns for c in columnas_indice):
+                        cur.execute(f"CREATE INDEX ON {staging} "
+                                    f"({', '.join(identificador(c) for c in columnas_indice)})")
+                cur.execute(f"ANALYZE {staging}")
+                filas += len(df_year)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    segundos = time.perf_counter() - inicio
+    print(f"  ✓ Tabla '{nombre_tabla}': {len(cambiadas)} particiones preparadas, {len(eliminadas)} eliminadas "
+          f"({filas} filas) en {segundos:.2f}s")
+    return segundos
+
+def intercambiar_particiones(cur, nombre_tabla: str, hashes: dict[str, str]):
+    """
+    Dentro de la transacción de publicación: DETACH/DROP de las particiones
+    anteriores de los años cambiados o eliminados, ATTACH de las nuevas y sus hashes
+    La tabla solo queda bloqueada durante el intercambio
+    """
+    anteriores = hashes_publicados(cur, nombre_tabla)
+    cambiadas = sorted(int(p) for p, h in hashes.items() if anteriores.get(p) != h)
+    eliminadas = sorted(int(p) for p in anteriores if p not in hashes)
+    tabla = identificador(nombre_tabla)
+    existentes = set(particiones_de(cur, nombre_tabla))
+    for year in cambiadas + eliminadas:
+        particion = nombre_particion(nombre_tabla, year)
+        if particion in existentes:
+            cur.execute(f"ALTER TABLE {tabla} DETACH PARTITION {identificador(particion)}")
+            cur.execute(f"DROP TABLE {identificador(particion)}")
+    for year in cambiadas:
+        particion = nombre_particion(nombre_tabla, year)
+        publicar_particion(cur, nombre_staging(particion))
+        cur.execute(f"ALTER TABLE {tabla} ATTACH PARTITION {identificador(particion)} "
+                    f"FOR VALUES FROM ({year}) TO ({year + 1})")
+        cur.execute(f"ALTER TABLE {identificador(particion)} DROP CONSTRAINT ck_year")
+    for year in eliminadas:
+        cur.execute(f"DELETE FROM {TABLA_ESTADO} WHERE tabla = %s AND particion = %s",
+                    (nombre_tabla, str(year)))
+    for year in cambiadas:
+        cur.execute(f"""
+            INSERT INTO {TABLA_ESTADO} (tabla, particion, hash) VALUES (%s, %s, %s)
+            ON CONFLICT (tabla, particion) DO UPDATE SET hash = EXCLUDED.hash, cargado = now()
+        """, (nombre_tabla, str(year), hashes[str(year)]))
+
+# Errores de conexión que no se arreglan esperando
+ERRORES_DEFINITIVOS = ('authentication failed', 'does not exist', 'no password supplied')
+
+def esperar_base(engine, timeout: float = DB_WAIT_TIMEOUT, espera_inicial: float = 0.1,
+                 espera_maxima: float = 2.0) -> float:
+    """
+    Prueba de disponibilidad: reintenta SELECT 1 con espera exponencial hasta
+    que PostgreSQL acepte conexiones (p. ej. el contenedor recién levantado)
+    Vuelve en cuanto responde, con los segundos esperados; credenciales o base
+    inexistente fallan enseguida, y pasado `timeout` se relanza el último error
+    """
+    inicio = time.perf_counter()
+    espera = espera_inicial
+    intentos = 0
+    while True:
+        intentos += 1
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return time.perf_counter() - inicio
+        except OperationalError as e:
+            mensaje = str(e.orig)
+            transcurrido = time.perf_counter() - inicio
+            if any(m in mensaje for m in ERRORES_DEFINITIVOS) or transcurrido + espera > timeout:
+                raise
+            if intentos == 1:
+                print(f"  Esperando a PostgreSQL (hasta {timeout:.0f}s)...")
+            time.sleep(espera)
+            espera = min(espera * 2, espera_maxima)
+
+def conectar():
+    """Engine con pool (una conexión por tabla en paralelo), cuando la base ya acepta conexiones"""
     print(f"\nConectando a PostgreSQL...")
     print(f"  URL: {DATABASE_URL.split('@')[1]}")  # Ocultar password
     
     try:
-        time.sleep(5)
-        engine = create_engine(DATABASE_URL)
-        
-        # Test conexión
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        with metricas.span('conectar') as span:
+            engine = create_engine(DATABASE_URL, pool_size=LOAD_MAX_WORKERS, max_overflow=2)
+            span['atributos']['espera'] = round(esperar_base(engine), 3)
         
         print("  ✓ Conexión exitosa")
     except Exception as e:
@@ -34,50 +469,89 @@ def cargar_a_postgres():
         print("  2. La base de datos exista: createdb -U postgres iadb_data")
         print("  3. Las credenciales en .env sean correctas")
         raise
-    
-    # Cargar datos procesados
-    print("\nCargando datos procesados...")
-    unified_file = PROCESSED_DIR / 'unified_data.csv'
-    
-    if unified_file.exists():
-        df_unified = pd.read_csv(unified_file)
-        df_unified.to_sql('unified_data', engine, if_exists='replace', index=False)
-        print(f"  ✓ Tabla 'unified_data': {len(df_unified)} filas")
+    return engine
+
+def tablas_a_cargar(df_unified: pd.DataFrame | None = None,
+                    kpis: dict[str, pd.DataFrame] | None = None) -> dict[str, pd.DataFrame | None]:
+    """unified_data + KPIs (None = se leen del archivo al cargar cada tabla)"""
+    if df_unified is None and not existe_tabla(PROCESSED_DIR, 'unified_data'):
+        print("  ⚠ No se encontró unified_data")
+        tablas = {}
     else:
-        print("  ⚠ No se encontró unified_data.csv")
-    
-    # Cargar KPIs
-    print("\nCargando KPIs...")
-    archivos_kpi = list(ANALYTICS_DIR.glob('kpi_*.csv'))
-    
-    if not archivos_kpi:
-        print("  ⚠ No se encontraron archivos KPI")
+        tablas = {'unified_data': df_unified}
+    if kpis is None:
+        kpis = {nombre: None for nombre in listar_tablas(ANALYTICS_DIR, prefijo='kpi_')}
     else:
-        for archivo in archivos_kpi:
-            nombre_tabla = archivo.stem  # nombre sin extensión
-            df_kpi = pd.read_csv(archivo)
-            df_kpi.to_sql(nombre_tabla, engine, if_exists='replace', index=False)
-            print(f"  ✓ Tabla '{nombre_tabla}': {len(df_kpi)} filas")
+        kpis = {f"kpi_{nombre}": df_kpi for nombre, df_kpi in kpis.items()}
+    if not kpis:
+        print("  ⚠ No se encontraron archivos KPI")
+    tablas.update(kpis)
+    return tablas
+
+def cargar_tabla(engine, nombre: str, df: pd.DataFrame | None = None, estado_bd: tuple | None = None) -> tuple[str, dict[str, str]]:
+    """
+    Carga una tabla: en staging o, si hay `estado_bd` (modo incremental), solo
+    sus particiones cambiadas
+    Devuelve (acción, hashes): 'sin cambios', 'upsert', 'particiones' o 'staging'
+    """
+    with metricas.span(f"carga:{nombre}") as span:
+        accion, hashes = _cargar_tabla(engine, nombre, df, estado_bd)
+        span['atributos']['accion'] = accion
+    return accion, hashes
+
+def _cargar_tabla(engine, nombre: str, df: pd.DataFrame | None, estado_bd: tuple | None) -> tuple[str, dict[str, str]]:
+    if df is None:
+        directorio = PROCESSED_DIR if nombre == 'unified_data' else ANALYTICS_DIR
+        df = leer_tabla(directorio, nombre)
+    # Tipos compactos también si los archivos son csv (year SMALLINT, indicadores REAL)
+    df = aplicar(df)
+    claves = claves_tabla(nombre, df)
+    hashes = hashes_particiones(df, claves)
+    hashes_bd, columnas_bd, pks_bd, particionadas_bd = estado_bd or ({}, {}, {}, set())
+    # Si cambian las columnas o el particionado, la tabla se reconstruye en staging
+    if estado_bd is not None and nombre in columnas_bd and columnas_bd[nombre] == list(df.columns) \
+       and (nombre in particionadas_bd) == particionar(nombre, df):
+        anteriores = hashes_bd.get(nombre, {})
+        if hashes == anteriores:
+            print(f"  = Tabla '{nombre}': sin cambios")
+            return 'sin cambios', hashes
+        if nombre in particionadas_bd:
+            reemplazar_particiones(engine, df, nombre, hashes, anteriores)
+            return 'particiones', hashes
+        if claves and pks_bd.get(nombre) == claves:
+            upsert_tabla(engine, df, nombre, claves, hashes, anteriores)
+            return 'upsert', hashes
+    preparar_tabla(engine, df, nombre)
+    return 'staging', hashes
+
+def publicar(engine, resultados: dict[str, tuple[str, dict[str, str]]]):
+    """Swap de las tablas en staging y actualización de las vistas materializadas"""
+    with metricas.span('publicar', tablas=len(resultados)):
+        _publicar(engine, resultados)
+
+def _publicar(engine, resultados: dict[str, tuple[str, dict[str, str]]]):
+    # Publicación atómica: swaps de staging, upserts e intercambios de particiones
+    # se aplican a la vez (ninguna tabla queda visible a medio actualizar)
+    en_staging = [nombre for nombre, (accion, _) in resultados.items() if accion == 'staging']
+    cambiadas = {nombre: r for nombre, r in resultados.items() if r[0] != 'sin cambios'}
+    if cambiadas:
+        print("\nPublicando tablas...")
+        publicar_tablas(engine, cambiadas)
+        print(f"  ✓ {len(cambiadas)} tablas publicadas en una sola transacción")
     
-    # Crear índices
-    print("\nCreando índices...")
-    try:
-        with engine.connect() as conn:
-            # Índice en unified_data
-            conn.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_unified_country 
-                ON unified_data(country_code)
-            """))
-            conn.execute(text("""
-                CREATE INDEX IF NOT EXISTS idx_unified_year 
-                ON unified_data(year)
-            """))
-            conn.commit()
-        print("  ✓ Índices creados")
-    except Exception as e:
-        print(f"  ⚠ Error creando índices: {e}")
+    # Vistas materializadas: se refrescan las de tablas con upsert y se crean las que falten
+    print("\nActualizando vistas materializadas...")
+    con_upsert = [nombre for nombre, (accion, _) in resultados.items() if accion in ('upsert', 'particiones')]
+    recreadas = vistas_afectadas(en_staging)
+    actualizar_vistas(engine, [v for v in vistas_afectadas(con_upsert) if v not in recreadas])
     
-    # Verificar tablas
+    # Generación nueva: las cachés de consultas se invalidan (solo si algo cambió)
+    if cambiadas:
+        generacion = registrar_carga(engine, list(cambiadas))
+        print(f"  ✓ Carga registrada: generación {generacion} ({len(cambiadas)} tablas)")
+
+def verificar(engine, tablas_kpi: list[str]):
+    """Tamaño de las tablas y conteo de registros"""
     print("\nVerificando tablas en base de datos...")
     query = """
         SELECT tablename, 
@@ -105,8 +579,7 @@ def cargar_a_postgres():
             print(f"  unified_data: {count:,} registros")
             
             # KPIs
-            for archivo in archivos_kpi:
-                tabla = archivo.stem
+            for tabla in tablas_kpi:
                 try:
                     result = conn.execute(text(f"SELECT COUNT(*) FROM {tabla}"))
                     count = result.scalar()
@@ -115,6 +588,48 @@ def cargar_a_postgres():
                     pass
     except Exception as e:
         print(f"  ⚠ Error contando registros: {e}")
+
+def cargar_a_postgres(df_unified: pd.DataFrame | None = None,
+                      kpis: dict[str, pd.DataFrame] | None = None,
+                      incremental: bool = LOAD_INCREMENTAL):
+    """
+    Carga el dataset unificado y todos los KPIs a PostgreSQL
+    Con `df_unified` / `kpis` (salidas de limpiar_datos / calcular_kpis)
+    se cargan directamente sin leer los archivos
+    En modo incremental solo se envían las particiones cuyo hash cambió (upsert,
+    o DETACH/ATTACH de particiones si la tabla está particionada por year)
+    """
+    print("="*60)
+    print("PASO 4: CARGA A POSTGRESQL")
+    print("="*60)
+    
+    engine = conectar()
+    tablas = tablas_a_cargar(df_unified, kpis)
+    
+    # Estado de la base: hashes ya cargados, columnas y claves primarias publicadas
+    estado_bd = leer_estado_bd(engine) if incremental else None
+    if incremental:
+        print("\nModo incremental: se comparan hashes por partición")
+    
+    # Cargar cada tabla (staging o upsert), en paralelo
+    print(f"\nCargando {len(tablas)} tablas ({LOAD_MAX_WORKERS} en paralelo)...")
+    inicio = time.perf_counter()
+    
+    # Si falla una carga o la publicación, las staging (copias completas de los datos) se borran
+    resultados = {}
+    try:
+        with ThreadPoolExecutor(max_workers=LOAD_MAX_WORKERS) as pool:
+            futuros = {pool.submit(cargar_tabla, engine, nombre, df, estado_bd): nombre
+                       for nombre, df in tablas.items()}
+            for futuro in as_completed(futuros):
+                resultados[futuros[futuro]] = futuro.result()
+        print(f"  Total carga: {time.perf_counter() - inicio:.2f}s")
+        
+        publicar(engine, resultados)
+    except Exception:
+        descartar_staging(engine, list(tablas))
+        raise
+    verificar(engine, [nombre for nombre in tablas if nombre != 'unified_data'])
     
     print("\n✓ Carga completada exitosamente")
     return True
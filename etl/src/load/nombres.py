@@ -0,0 +1,14 @@
+"""
+Nombres compartidos entre la carga (src/load/load.py), que escribe las tablas,
+y el servicio de consultas (src/servicio), que las lee
+Sin pandas ni sqlalchemy: el servicio lo importa sin cargar la etapa de carga
+"""
+
+# Una fila por carga publicada: el servicio de consultas vacía su caché
+# cuando cambia la última generación
+TABLA_CARGAS = 'etl_cargas'
+
+
+def identificador(nombre: str) -> str:
+    """Nombre entre comillas dobles (las columnas tienen paréntesis y mayúsculas)"""
+    return '"' + nombre.replace('"', '""') + '"'
@@ -0,0 +1,138 @@
+"""
+Vistas materializadas para las consultas de análisis (sql/consultas.sql)
+mv_notas junta, por fila de kpi_pais_año (country_code, year, area, sex), el
+promedio PISA con los indicadores; el resto son agregados por país sobre ella
+Tras un swap se recrean en la misma transacción; tras un upsert se refrescan
+con REFRESH ... CONCURRENTLY (los lectores no se bloquean)
+"""
+from sqlalchemy import text
+
+PISA = ['meanscoreinreading(pisa)', 'meanscoreinmathematics(pisa)', 'meanscoreinscience(pisa)']
+ASISTENCIA = ['grossattendancerateprimaryeducation', 'grossattendanceratesecondaryeducation',
+              'grossattendanceratetertiaryeducation']
+POBREZA = 'percentageofthepopulationinpoverty'
+INTERNET = 'percentagewithaccesstoschoolswithinternet'
+
+# Vistas en orden de creación
+#   depende:   tablas o vistas de las que lee
+#   requiere:  columnas que deben existir en cada tabla
+#   unico:     columnas del índice único (necesario para REFRESH CONCURRENTLY)
+#   indices:   índices adicionales para las consultas del dashboard
+VISTAS = {
+    'mv_notas': {
+        'depende': ['kpi_pais_año'],
+        'requiere': {'kpi_pais_año': ['country_code', 'year', 'area', 'sex', 'country_name',
+                                      *PISA, *ASISTENCIA, POBREZA, INTERNET]},
+        'sql': f"""
+            SELECT country_code, year, area, sex, country_name,
+                   trunc(({' + '.join(f'"{c}"' for c in PISA)}) / 3) AS grades,
+                   {', '.join(f'"{c}"' for c in ASISTENCIA)},
+                   "{POBREZA}", "{INTERNET}"
+            FROM "kpi_pais_año"
+        """,
+        'unico': ['country_code', 'year', 'area', 'sex'],
+        'indices': [['area', 'sex'], [POBREZA]],
+    },
+    'mv_asistencia_notas': {
+        'depende': ['mv_notas'],
+        'sql': """
+            SELECT country_code, country_name,
+                   avg("grossattendancerateprimaryeducation") AS avg_primary_attendance,
+                   avg("grossattendanceratesecondaryeducation") AS avg_secondary_attendance,
+                   avg("grossattendanceratetertiaryeducation") AS avg_tertiary_attendance,
+                   avg(grades) AS avg_grades
+            FROM mv_notas
+            WHERE area = 'Total' AND sex = 'Total'
+            GROUP BY country_code, country_name
+        """,
+        'unico': ['country_code'],
+    },
+    'mv_pobreza_notas': {
+        'depende': ['mv_notas'],
+        'sql': f"""
+            SELECT country_code, country_name,
+                   coalesce(corr("{POBREZA}", grades), 0) AS corr_poverty_grades
+            FROM mv_notas
+            GROUP BY country_code, country_name
+        """,
+        'unico': ['country_code'],
+    },
+    'mv_internet_notas': {
+        'depende': ['mv_notas'],
+        'sql': f"""
+            SELECT country_code, country_name,
+                   corr(grades, "{INTERNET}") AS corr_internet_grades
+            FROM mv_notas
+            GROUP BY country_code, country_name
+        """,
+        'unico': ['country_code'],
+    },
+    'mv_pobreza_asistencia': {
+        'depende': ['mv_notas'],
+        'sql': f"""
+            SELECT country_code, country_name,
+                   avg("grossattendancerateprimaryeducation") AS avg_primary_attendance,
+                   avg("grossattendanceratesecondaryeducation") AS avg_secondary_attendance,
+                   avg("grossattendanceratetertiaryeducation") AS avg_tertiary_attendance,
+                   avg("{POBREZA}") AS avg_poverty_rate
+            FROM mv_notas
+            GROUP BY country_code, country_name
+        """,
+        'unico': ['country_code'],
+    },
+}
+
+def _columnas(columnas: list[str]) -> str:
+    return ', '.join(f'"{c}"' for c in columnas)
+
+def vistas_afectadas(tablas: list[str]) -> list[str]:
+    """Vistas que dependen (directa o indirectamente) de alguna de `tablas`, en orden de creación"""
+    afectadas = []
+    for nombre, vista in VISTAS.items():
+        if set(vista['depende']) & (set(tablas) | set(afectadas)):
+            afectadas.append(nombre)
+    return afectadas
+
+def vistas_existentes(conn) -> set[str]:
+    return set(conn.execute(text(
+        "SELECT matviewname FROM pg_matviews WHERE schemaname = 'public'"
+    )).scalars())
+
+def eliminar_vistas(conn, nombres: list[str]):
+    for nombre in reversed(nombres):
+        conn.execute(text(f"DROP MATERIALIZED VIEW IF EXISTS {nombre} CASCADE"))
+
+def crear_vistas(conn, nombres: list[str]):
+    """Crea las vistas (con sus índices) cuyas tablas y columnas existen"""
+    existentes = vistas_existentes(conn)
+    for nombre in nombres:
+        vista = VISTAS[nombre]
+        faltantes = [d for d in vista['depende'] if d.startswith('mv_') and d not in existentes]
+        for tabla, columnas in vista.get('requiere', {}).items():
+            presentes = set(conn.execute(text(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = 'public' AND table_name = :tabla"
+            ), {'tabla': tabla}).scalars())
+            faltantes += [f"{tabla}.{c}" for c in columnas if c not in presentes]
+        if faltantes:
+            print(f"  ⚠ Vista '{nombre}' omitida, faltan: {', '.join(faltantes)}")
+            continue
+        conn.execute(text(f"CREATE MATERIALIZED VIEW {nombre} AS {vista['sql']}"))
+        conn.execute(text(f"CREATE UNIQUE INDEX ux_{nombre} ON {nombre} ({_columnas(vista['unico'])})"))
+        for i, columnas in enumerate(vista.get('indices', [])):
+            conn.execute(text(f"CREATE INDEX idx_{nombre}_{i} ON {nombre} ({_columnas(columnas)})"))
+        existentes.add(nombre)
+        print(f"  ✓ Vista '{nombre}' creada")
+
+def actualizar_vistas(engine, refrescar: list[str]):
+    """
+    Refresca (CONCURRENTLY) las vistas de `refrescar` y crea las que falten
+    Cada vista va en su propia transacción, en orden de dependencia
+    """
+    for nombre in VISTAS:
+        with engine.begin() as conn:
+            if nombre not in vistas_existentes(conn):
+                crear_vistas(conn, [nombre])
+            elif nombre in refrescar:
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {nombre}"))
+                print(f"  ✓ Vista '{nombre}' refrescada")
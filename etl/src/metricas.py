@@ -0,0 +1,203 @@
+"""
+Métricas de la corrida
+- span(nombre): bloque medido (duración y memoria residente al abrir y al cerrar);
+  los spans de un mismo hilo se anidan, y en otro hilo se puede indicar el `padre` explícitamente
+- contar(...): suma filas y bytes al span activo del hilo (y a sus ancestros)
+- guardar_reporte(): JSON con todos los spans, totales por nombre y el pico de memoria del proceso
+- perfilar(modo): cProfile o pyinstrument alrededor de un bloque
+"""
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from config import METRICAS_DIR
+
+try:
+    import resource
+except ImportError:  # Windows: la memoria se lee con GetProcessMemoryInfo
+    resource = None
+
+CONTADORES = ('filas_entrada', 'filas_salida', 'bytes_leidos', 'bytes_escritos')
+
+_local = threading.local()
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_spans: list[dict] = []
+_totales = dict.fromkeys(CONTADORES, 0)
+_inicio = time.perf_counter()
+
+
+def _memoria_windows() -> tuple[int, int]:
+    """(memoria residente actual, pico) en bytes, con GetProcessMemoryInfo"""
+    import ctypes
+    from ctypes import wintypes
+
+    class Contadores(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    contadores = Contadores()
+    contadores.cb = ctypes.sizeof(contadores)
+    kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(Contadores), wintypes.DWORD]
+    psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(contadores), contadores.cb)
+    return contadores.WorkingSetSize, contadores.PeakWorkingSetSize
+
+
+def rss_mb() -> float | None:
+    """Memoria residente actual del proceso (None si la plataforma no la expone, p. ej. macOS)"""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return round(paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    if sys.platform == 'win32':
+        return round(_memoria_windows()[0] / (1024 * 1024), 1)
+    return None
+
+
+def rss_max_mb() -> float:
+    """Pico de memoria residente del proceso (ru_maxrss está en KB en Linux y en bytes en macOS)"""
+    if resource is None:
+        return round(_memoria_windows()[1] / (1024 * 1024), 1)
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maximo / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _pila() -> list[dict]:
+    if not hasattr(_local, 'pila'):
+        _local.pila = []
+    return _local.pila
+
+
+def actual() -> int | None:
+    """id del span abierto en este hilo (para usarlo como `padre` desde otro hilo)"""
+    pila = _pila()
+    return pila[-1]['id'] if pila else None
+
+
+@contextmanager
+def span(nombre: str, padre: int | None = None, **atributos):
+    pila = _pila()
+    registro = {
+        'id': next(_ids),
+        'padre': padre if padre is not None else (pila[-1]['id'] if pila else None),
+        'nombre': nombre,
+        'hilo': threading.current_thread().name,
+        'inicio': round(time.perf_counter() - _inicio, 4),
+        **dict.fromkeys(CONTADORES, 0),
+        'rss_inicio_mb': rss_mb(),
+        'atributos': atributos,
+    }
+    pila.append(registro)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro['error'] = repr(e)
+        raise
+    finally:
+        pila.pop()
+        registro['segundos'] = round(time.perf_counter() - inicio, 4)
+        # Memoria de la etapa: RSS actual al cerrar (el pico del proceso va una sola vez en el reporte)
+        registro['rss_fin_mb'] = rss_mb()
+        with _lock:
+            _spans.append(registro)
+
+
+def contar(**valores: int):
+    """contar(filas_salida=n, bytes_escritos=b, ...) en el span activo y sus ancestros del hilo"""
+    pila = _pila()
+    with _lock:
+        for clave, valor in valores.items():
+            _totales[clave] += int(valor)
+    for registro in pila:
+        for clave, valor in valores.items():
+            registro[clave] += int(valor)
+
+
+def totales() -> dict[str, int]:
+    with _lock:
+        return dict(_totales)
+
+
+def reiniciar():
+    global _inicio
+    with _lock:
+        _spans.clear()
+        _totales.update(dict.fromkeys(CONTADORES, 0))
+        _inicio = time.perf_counter()
+
+
+def reporte(**meta) -> dict:
+    """Spans cerrados (en orden de inicio), agregados por nombre y totales de la corrida"""
+    with _lock:
+        spans = sorted(_spans, key=lambda s: s['inicio'])
+        totales = dict(_totales)
+    por_nombre = {}
+    for s in spans:
+        agregado = por_nombre.setdefault(s['nombre'], {'veces': 0, 'segundos': 0.0, **dict.fromkeys(CONTADORES, 0)})
+        agregado['veces'] += 1
+        agregado['segundos'] = round(agregado['segundos'] + s['segundos'], 4)
+        for clave in CONTADORES:
+            agregado[clave] += s[clave]
+    return {**meta, 'rss_max_mb': rss_max_mb(), 'totales': totales, 'por_nombre': por_nombre, 'spans': spans}
+
+
+def guardar_reporte(inicio: datetime, ruta: Path | None = None, **meta) -> Path:
+    ruta = Path(ruta) if ruta is not None else METRICAS_DIR / f"corrida_{inicio:%Y%m%d_%H%M%S}.json"
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fin = datetime.now()
+    datos = reporte(inicio=inicio.isoformat(), fin=fin.isoformat(),
+                    segundos=round((fin - inicio).total_seconds(), 3), **meta)
+    ruta.write_text(json.dumps(datos, indent=2, ensure_ascii=False, default=str))
+    return ruta
+
+
+@contextmanager
+def perfilar(modo: str | None, inicio: datetime):
+    """
+    Perfil del bloque con `modo` = 'cprofile' (.prof, para pstats/snakeviz) o
+    'pyinstrument' (.html); ambos ven solo el hilo que los inicia
+    """
+    if modo is None:
+        yield
+        return
+    METRICAS_DIR.mkdir(parents=True, exist_ok=True)
+    base = METRICAS_DIR / f"perfil_{inicio:%Y%m%d_%H%M%S}"
+    if modo == 'cprofile':
+        import cProfile
+        perfil = cProfile.Profile()
+        perfil.enable()
+        try:
+            yield
+        finally:
+            perfil.disable()
+            perfil.dump_stats(base.with_suffix('.prof'))
+            print(f"  Perfil cProfile: {base.with_suffix('.prof')}")
+    elif modo == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("  ⚠ pyinstrument no está instalado (pip install pyinstrument); se sigue sin perfil")
+            yield
+            return
+        perfil = Profiler()
+        perfil.start()
+        try:
+            yield
+        finally:
+            perfil.stop()
+            base.with_suffix('.html').write_text(perfil.output_html())
+            print(f"  Perfil pyinstrument: {base.with_suffix('.html')}")
+    else:
+        raise ValueError(f"Perfil desconocido: {modo} (cprofile | pyinstrument)")
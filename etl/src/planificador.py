@@ -0,0 +1,315 @@
+"""
+Planificador de tareas del pipeline (DAG)
+Cada tarea declara de qué tareas depende; las que no dependen entre sí corren
+en paralelo en un pool de hilos, así la duración total se acerca a la del
+camino crítico. Las tareas completadas se anotan en un checkpoint para poder
+reanudar una corrida que falló sin repetir lo que ya terminó
+Las tareas con huella (src/huellas.py) se saltan si sus entradas, código y
+configuración no cambiaron desde la última ejecución exitosa
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable
+
+from config import PIPELINE_CHECKPOINT, PIPELINE_HUELLAS, PIPELINE_MAX_WORKERS
+from src import metricas
+from src.huellas import hashes_salidas, salidas_intactas
+
+
+class Tarea:
+    """
+    `funcion` recibe un dict {dependencia: resultado}; el resultado de una
+    dependencia que se completó en una corrida anterior, o que se saltó por
+    huella, es None
+    Con `checkpoint=False` la tarea no se anota (su resultado solo vive en
+    memoria): al reanudar se vuelve a ejecutar si alguna tarea pendiente la necesita,
+    y su huella se registra solo si toda la corrida termina bien
+    `huella` se evalúa cuando la tarea está lista; `salidas` son los archivos
+    que escribe, que deben seguir intactos para poder saltarla
+    `estado` describe lo que la tarea deja fuera de los archivos (p. ej. una
+    tabla en PostgreSQL): se registra al terminar la corrida y, si ya no
+    coincide (o no se puede leer), la tarea se ejecuta aunque su huella no cambió
+    """
+
+    def __init__(self, nombre: str, funcion: Callable[[dict[str, Any]], Any],
+                 depende: list[str] | tuple[str, ...] = (), checkpoint: bool = True,
+                 huella: Callable[[], str] | None = None, salidas: Callable[[], list[Path]] | None = None,
+                 estado: Callable[[], Any] | None = None):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.depende = list(depende)
+        self.checkpoint = checkpoint
+        self.huella = huella
+        self.salidas = salidas
+        self.estado = estado
+
+
+class Perezoso:
+    """Valor compartido entre tareas que se calcula la primera vez que alguna lo pide"""
+
+    def __init__(self, calcular: Callable[[], Any]):
+        self._calcular = calcular
+        self._lock = threading.Lock()
+        self._listo = False
+        self._valor = None
+
+    def __call__(self) -> Any:
+        with self._lock:
+            if not self._listo:
+                self._valor = self._calcular()
+                self._listo = True
+            return self._valor
+
+    @property
+    def listo(self) -> bool:
+        return self._listo
+
+
+class EjecutorEnLinea:
+    """Ejecuta cada tarea en el hilo que la envía (workers=0, p. ej. para perfilar)"""
+
+    def __init__(self, **_):
+        pass
+
+    def submit(self, funcion, *args) -> Future:
+        futuro = Future()
+        try:
+            futuro.set_result(funcion(*args))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Planificador:
+    """Con `workers=0` las tareas corren en serie en el hilo que llama a ejecutar()"""
+
+    def __init__(self, workers: int = PIPELINE_MAX_WORKERS, checkpoint: Path = PIPELINE_CHECKPOINT,
+                 reanudar: bool = False, forzar: bool = False, registro: Path = PIPELINE_HUELLAS):
+        self.workers = workers
+        self.ruta_checkpoint = Path(checkpoint)
+        self.reanudar = reanudar
+        self.forzar = forzar
+        self.ruta_registro = Path(registro)
+        self.tareas: dict[str, Tarea] = {}
+        self.resultados: dict[str, Any] = {}
+        self.tiempos: dict[str, float] = {}
+        self.omitidas: set[str] = set()
+        self._completadas: dict[str, float] = {}
+        self._registro: dict[str, dict] = {}
+        self._huellas: dict[str, str] = {}
+        self._diferidas: dict[str, dict] = {}
+        self._span = None
+        self._lock = threading.Lock()
+
+    def agregar(self, nombre: str, funcion: Callable[[dict[str, Any]], Any],
+                depende: list[str] | tuple[str, ...] = (), checkpoint: bool = True,
+                huella: Callable[[], str] | None = None, salidas: Callable[[], list[Path]] | None = None,
+                estado: Callable[[], Any] | None = None) -> str:
+        if nombre in self.tareas:
+            raise ValueError(f"Tarea duplicada: {nombre}")
+        self.tareas[nombre] = Tarea(nombre, funcion, depende, checkpoint, huella, salidas, estado)
+        return nombre
+
+    def _validar(self):
+        """Dependencias existentes y sin ciclos"""
+        for tarea in self.tareas.values():
+            faltantes = [d for d in tarea.depende if d not in self.tareas]
+            if faltantes:
+                raise ValueError(f"La tarea '{tarea.nombre}' depende de tareas inexistentes: {faltantes}")
+        visitadas, en_curso = set(), set()
+        def visitar(nombre: str):
+            if nombre in en_curso:
+                raise ValueError(f"Ciclo de dependencias en '{nombre}'")
+            if nombre in visitadas:
+                return
+            en_curso.add(nombre)
+            for dependencia in self.tareas[nombre].depende:
+                visitar(dependencia)
+            en_curso.discard(nombre)
+            visitadas.add(nombre)
+        for nombre in self.tareas:
+            visitar(nombre)
+
+    def _leer_checkpoint(self) -> dict[str, float]:
+        try:
+            return json.loads(self.ruta_checkpoint.read_text()).get('completadas', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _guardar_checkpoint(self):
+        self.ruta_checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.ruta_checkpoint.with_suffix('.json.tmp')
+        tmp.write_text(json.dumps({'completadas': self._completadas}, indent=2, ensure_ascii=False))
+        os.replace(tmp, self.ruta_checkpoint)
+
+    def _leer_registro(self) -> dict[str, dict]:
+        try:
+            return json.loads(self.ruta_registro.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _guardar_registro(self):
+        self.ruta_registro.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.ruta_registro.with_suffix('.json.tmp')
+        tmp.write_text(json.dumps(self._registro, indent=2, ensure_ascii=False))
+        os.replace(tmp, self.ruta_registro)
+
+    def _registrar(self, tarea: Tarea):
+        """Huella y hashes de las salidas de una tarea ejecutada (las omitidas ya están registradas)"""
+        if tarea.nombre not in self._huellas or tarea.nombre in self.omitidas:
+            return
+        entrada = {
+            'huella': self._huellas[tarea.nombre],
+            'salidas': hashes_salidas(tarea.salidas()) if tarea.salidas else {},
+        }
+        if tarea.checkpoint:
+            if tarea.estado is not None:
+                entrada['estado'] = tarea.estado()
+            self._registro[tarea.nombre] = entrada
+            self._guardar_registro()
+        else:
+            self._diferidas[tarea.nombre] = entrada
+
+    def _a_ejecutar(self) -> set[str]:
+        """
+        Tareas pendientes: las anotadas en el checkpoint se saltan; las que no se
+        anotan solo corren si alguna tarea pendiente depende de ellas
+        """
+        necesarias = {n for n, t in self.tareas.items() if t.checkpoint and n not in self._completadas}
+        pila = list(necesarias)
+        while pila:
+            for dependencia in self.tareas[pila.pop()].depende:
+                if not self.tareas[dependencia].checkpoint and dependencia not in necesarias:
+                    necesarias.add(dependencia)
+                    pila.append(dependencia)
+        return necesarias
+
+    def ejecutar(self) -> dict[str, Any]:
+        """Ejecuta el DAG; ante el primer error espera las tareas en curso y lo relanza"""
+        self._validar()
+        self._completadas = self._leer_checkpoint() if self.reanudar else {}
+        self._registro = self._leer_registro()
+        if not self.reanudar:
+            self.ruta_checkpoint.unlink(missing_ok=True)
+
+        pendientes = self._a_ejecutar()
+        saltadas = [n for n in self.tareas if n not in pendientes]
+        if self.reanudar and saltadas:
+            print(f"Reanudando: {len(self._completadas)} tareas ya completadas, {len(pendientes)} pendientes")
+        terminadas = set(saltadas)
+
+        inicio = time.perf_counter()
+        error = None
+        self._span = metricas.actual()
+        ejecutor = ThreadPoolExecutor if self.workers > 0 else EjecutorEnLinea
+        with ejecutor(max_workers=self.workers, thread_name_prefix='tarea') as pool:
+            en_curso = {}
+            while pendientes or en_curso:
+                if error is None:
+                    listas = [n for n in self.tareas if n in pendientes
+                              and all(d in terminadas for d in self.tareas[n].depende)]
+                    for nombre in listas:
+                        pendientes.discard(nombre)
+                        en_curso[pool.submit(self._correr, self.tareas[nombre])] = nombre
+                if not en_curso:
+                    break
+                hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    nombre = en_curso.pop(futuro)
+                    try:
+                        self.resultados[nombre] = futuro.result()
+                    except Exception as e:
+                        print(f"  ✗ {nombre}: {e}")
+                        error = error or e
+                        continue
+                    terminadas.add(nombre)
+                    if nombre in self.omitidas:
+                        print(f"  = {nombre}: sin cambios")
+                    else:
+                        print(f"  ✓ {nombre} ({self.tiempos[nombre]:.2f}s)")
+                    with self._lock:
+                        self._registrar(self.tareas[nombre])
+                        if self.tareas[nombre].checkpoint:
+                            self._completadas[nombre] = round(self.tiempos[nombre], 3)
+                            self._guardar_checkpoint()
+
+        if error is not None:
+            print(f"\n{len(self._completadas)} tareas anotadas en {self.ruta_checkpoint}; "
+                  f"se puede reanudar con --reanudar")
+            raise error
+
+        # Las tareas sin checkpoint (p. ej. cargas en staging) solo valen si todo terminó;
+        # su estado se lee ahora, con lo que dejó publicado la corrida
+        if self._diferidas:
+            for nombre, entrada in self._diferidas.items():
+                if self.tareas[nombre].estado is not None:
+                    entrada['estado'] = self.tareas[nombre].estado()
+            self._registro.update(self._diferidas)
+            self._guardar_registro()
+
+        total = time.perf_counter() - inicio
+        print(f"\nTareas: {len(self.tiempos) - len(self.omitidas)} ejecutadas, {len(self.omitidas)} sin cambios, "
+              f"en {total:.2f}s (suma de tiempos: {sum(self.tiempos.values()):.2f}s, "
+              f"camino crítico: {self.camino_critico():.2f}s)")
+        self.ruta_checkpoint.unlink(missing_ok=True)
+        return self.resultados
+
+    def _vigente(self, tarea: Tarea, huella: str) -> bool:
+        """
+        La huella coincide con la de la última ejecución exitosa, las salidas
+        siguen intactas y el estado externo es el registrado
+        """
+        registrada = self._registro.get(tarea.nombre)
+        if (self.forzar or registrada is None or registrada.get('huella') != huella
+                or not salidas_intactas(registrada.get('salidas', {}))):
+            return False
+        if tarea.estado is None:
+            return True
+        try:
+            return 'estado' in registrada and tarea.estado() == registrada['estado']
+        except Exception as e:
+            print(f"  ⚠ {tarea.nombre}: no se pudo comprobar su estado ({e}), se ejecuta")
+            return False
+
+    def _correr(self, tarea: Tarea) -> Any:
+        # Los spans de cada tarea cuelgan del span abierto al llamar a ejecutar()
+        with metricas.span(f"tarea:{tarea.nombre}", padre=self._span) as span:
+            resultado = self._correr_tarea(tarea)
+            span['atributos']['omitida'] = tarea.nombre in self.omitidas
+            return resultado
+
+    def _correr_tarea(self, tarea: Tarea) -> Any:
+        entradas = {d: self.resultados.get(d) for d in tarea.depende}
+        inicio = time.perf_counter()
+        if tarea.huella is not None:
+            huella = tarea.huella()
+            with self._lock:
+                self._huellas[tarea.nombre] = huella
+            if self._vigente(tarea, huella):
+                with self._lock:
+                    self.omitidas.add(tarea.nombre)
+                self.tiempos[tarea.nombre] = time.perf_counter() - inicio
+                return None
+        resultado = tarea.funcion(entradas)
+        self.tiempos[tarea.nombre] = time.perf_counter() - inicio
+        return resultado
+
+    def camino_critico(self) -> float:
+        """Duración de la cadena de dependencias más larga (con los tiempos de esta corrida)"""
+        fin = {}
+        def terminar(nombre: str) -> float:
+            if nombre not in fin:
+                previo = max((terminar(d) for d in self.tareas[nombre].depende), default=0.0)
+                fin[nombre] = previo + self.tiempos.get(nombre, 0.0)
+            return fin[nombre]
+        return max((terminar(n) for n in self.tareas), default=0.0)
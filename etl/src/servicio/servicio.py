@@ -0,0 +1,250 @@
+"""
+SERVICIO DE CONSULTAS DE KPIs
+Lectura de las tablas de KPIs que publica la carga, filtradas por país, año,
+área y sexo, para dashboards y análisis sin ir a PostgreSQL en cada refresco
+- caché LRU de resultados en memoria y un pool de conexiones
+- la caché se invalida sola: la carga registra una generación nueva en
+  etl_cargas al terminar, y el servicio la consulta como mucho cada CONSULTAS_TTL segundos
+- servidor HTTP opcional (solo biblioteca estándar): python -m src.servicio.servicio
+No importa pandas: arranca rápido y cada lectura en caché es un acceso a un dict
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+from config import (DATABASE_URL, CONSULTAS_HOST, CONSULTAS_PORT, CONSULTAS_CACHE, CONSULTAS_TTL,
+                    CONSULTAS_POOL)
+from src.analyze.kpis import KPIS
+from src.load.nombres import TABLA_CARGAS, identificador
+
+# Filtro -> columna de las tablas de KPIs (cada tabla tiene solo algunas)
+FILTROS = {'pais': 'country_code', 'year': 'year', 'area': 'area', 'sexo': 'sex'}
+
+# Orden de las filas: las columnas de la clave que tenga la tabla
+ORDEN = ['country_code', 'year', 'area', 'sex']
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+class KPIDesconocido(KeyError):
+    """El nombre no está en el registro KPIS (404)"""
+
+
+class TablaNoCargada(LookupError):
+    """El KPI existe pero su tabla todavía no se cargó (503)"""
+
+
+def normalizar(valor):
+    # NaN no es JSON válido
+    return None if isinstance(valor, float) and math.isnan(valor) else valor
+
+
+@dataclass(frozen=True)
+class Resultado:
+    """Filas de un KPI (inmutable: se comparte entre todos los que lo piden)"""
+    kpi: str
+    generacion: int | None
+    columnas: tuple[str, ...]
+    filas: tuple[tuple, ...]
+
+    def registros(self) -> list[dict]:
+        return [dict(zip(self.columnas, fila)) for fila in self.filas]
+
+    @cached_property
+    def json(self) -> bytes:
+        """Respuesta HTTP serializada una sola vez"""
+        return json.dumps({'kpi': self.kpi, 'generacion': self.generacion, 'filas': len(self.filas),
+                           'datos': self.registros()}, ensure_ascii=False, default=str).encode()
+
+    @cached_property
+    def etag(self) -> str:
+        return '"' + hashlib.sha256(self.json).hexdigest()[:32] + '"'
+
+
+class ServicioKPIs:
+    """
+    Consultas de KPIs con caché LRU (`capacidad` resultados) sobre un engine con pool
+    La generación de etl_cargas se consulta como mucho cada `ttl` segundos; si
+    cambió, la caché se vacía antes de responder
+    """
+
+    def __init__(self, engine=None, capacidad: int = CONSULTAS_CACHE, ttl: float = CONSULTAS_TTL):
+        self.engine = engine or create_engine(DATABASE_URL, pool_size=CONSULTAS_POOL, max_overflow=2,
+                                              pool_pre_ping=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generacion = None
+        self._revisada = None
+        self._consultar = lru_cache(maxsize=capacidad)(self._consultar_bd)
+        self._columnas = lru_cache(maxsize=len(KPIS))(self._columnas_bd)
+
+    def generacion(self) -> int | None:
+        """Última generación cargada (None si la carga todavía no registró ninguna)"""
+        ahora = time.monotonic()
+        with self._lock:
+            if self._revisada is not None and ahora - self._revisada < self.ttl:
+                return self._generacion
+        with self.engine.connect() as conn:
+            if conn.execute(text(f"SELECT to_regclass('{TABLA_CARGAS}')")).scalar() is None:
+                actual = None
+            else:
+                actual = conn.execute(text(f"SELECT max(generacion) FROM {TABLA_CARGAS}")).scalar()
+        with self._lock:
+            if actual != self._generacion:
+                self._consultar.cache_clear()
+                self._columnas.cache_clear()
+                self._generacion = actual
+            self._revisada = ahora
+            return actual
+
+    def invalidar(self):
+        """Vacía la caché y fuerza a releer la generación en la próxima consulta"""
+        with self._lock:
+            self._consultar.cache_clear()
+            self._columnas.cache_clear()
+            self._revisada = None
+
+    def consultar(self, kpi: str, pais=None, year=None, area=None, sexo=None) -> Resultado:
+        """
+        Filas del KPI `kpi` (nombre del registro KPIS, p. ej. 'pais_año')
+        Cada filtro acepta un valor o una lista; None = sin filtrar
+        """
+        if kpi not in KPIS:
+            raise KPIDesconocido(f"KPI desconocido: {kpi}. Disponibles: {list(KPIS)}")
+        generacion = self.generacion()
+        filtros = []
+        for nombre, valores in (('pais', pais), ('year', year), ('area', area), ('sexo', sexo)):
+            if valores is None:
+                continue
+            valores = [valores] if isinstance(valores, (str, int)) else list(valores)
+            if nombre == 'year':
+                try:
+                    valores = [int(v) for v in valores]
+                except ValueError:
+                    raise FiltroInvalido(f"year debe ser numérico: {valores}") from None
+            filtros.append((FILTROS[nombre], tuple(sorted(set(valores)))))
+        # La generación va en la clave: un resultado cacheado nunca es de otra carga
+        return self._consultar(generacion, kpi, tuple(filtros))
+
+    def estadisticas(self) -> dict:
+        info = self._consultar.cache_info()
+        return {'generacion': self._generacion, 'aciertos': info.hits, 'fallos': info.misses,
+                'en_cache': info.currsize, 'capacidad': info.maxsize}
+
+    def _columnas_bd(self, generacion: int | None, tabla: str) -> tuple[str, ...]:
+        with self.engine.connect() as conn:
+            return tuple(conn.execute(text("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = :tabla ORDER BY ordinal_position
+            """), {'tabla': tabla}).scalars())
+
+    def _consultar_bd(self, generacion: int | None, kpi: str, filtros: tuple) -> Resultado:
+        tabla = KPIS[kpi]['tabla']
+        columnas = self._columnas(generacion, tabla)
+        if not columnas:
+            raise TablaNoCargada(f"La tabla {tabla} no está cargada")
+        faltantes = [f for f, c in FILTROS.items() if c in dict(filtros) and c not in columnas]
+        if faltantes:
+            validos = [f for f, c in FILTROS.items() if c in columnas]
+            raise FiltroInvalido(f"{kpi} no se puede filtrar por {faltantes}; filtros válidos: {validos}")
+
+        condiciones = [f"{identificador(columna)} = ANY(:f{i})" for i, (columna, _) in enumerate(filtros)]
+        orden = [identificador(c) for c in ORDEN if c in columnas]
+        sql = (f"SELECT * FROM {identificador(tabla)}"
+               + (f" WHERE {' AND '.join(condiciones)}" if condiciones else "")
+               + (f" ORDER BY {', '.join(orden)}" if orden else ""))
+        with self.engine.connect() as conn:
+            resultado = conn.execute(text(sql), {f"f{i}": list(valores) for i, (_, valores) in enumerate(filtros)})
+            filas = tuple(tuple(normalizar(v) for v in fila) for fila in resultado)
+            return Resultado(kpi, generacion, tuple(resultado.keys()), filas)
+
+
+def crear_servidor(servicio: ServicioKPIs, host: str = CONSULTAS_HOST, port: int = CONSULTAS_PORT) -> ThreadingHTTPServer:
+    """
+    GET /kpis                        KPIs disponibles
+    GET /kpis/<kpi>?pais=ARG,BOL&year=2020&area=Total&sexo=Total
+    GET /estado                      generación y estadísticas de la caché
+    Las respuestas de KPIs llevan ETag: con If-None-Match se responde 304
+    """
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            partes = [unquote(p) for p in url.path.strip('/').split('/') if p]
+            try:
+                if partes == ['kpis']:
+                    self._json({n: {'titulo': k['titulo'], 'tabla': k['tabla']} for n, k in KPIS.items()})
+                elif partes == ['estado']:
+                    servicio.generacion()
+                    self._json(servicio.estadisticas())
+                elif len(partes) == 2 and partes[0] == 'kpis':
+                    parametros = parse_qs(url.query)
+                    desconocidos = [p for p in parametros if p not in FILTROS]
+                    if desconocidos:
+                        raise FiltroInvalido(f"Filtros desconocidos: {desconocidos}; válidos: {list(FILTROS)}")
+                    filtros = {nombre: [v for valor in valores for v in valor.split(',') if v]
+                               for nombre, valores in parametros.items()}
+                    resultado = servicio.consultar(partes[1], **filtros)
+                    if self.headers.get('If-None-Match') == resultado.etag:
+                        self.send_response(HTTPStatus.NOT_MODIFIED)
+                        self.send_header('ETag', resultado.etag)
+                        self.end_headers()
+                        return
+                    self._responder(HTTPStatus.OK, resultado.json, {'ETag': resultado.etag})
+                else:
+                    self._json({'error': 'Ruta desconocida'}, HTTPStatus.NOT_FOUND)
+            except KPIDesconocido as e:
+                self._json({'error': e.args[0]}, HTTPStatus.NOT_FOUND)
+            except FiltroInvalido as e:
+                self._json({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+            except (TablaNoCargada, SQLAlchemyError) as e:
+                self._json({'error': str(e).splitlines()[0]}, HTTPStatus.SERVICE_UNAVAILABLE)
+            except Exception:
+                # Un error de programación: 500, y la traza queda en el log del servidor
+                self._json({'error': 'Error interno'}, HTTPStatus.INTERNAL_SERVER_ERROR)
+                raise
+
+        def _json(self, datos, estado: HTTPStatus = HTTPStatus.OK):
+            self._responder(estado, json.dumps(datos, ensure_ascii=False, default=str).encode())
+
+        def _responder(self, estado: HTTPStatus, cuerpo: bytes, cabeceras: dict | None = None):
+            self.send_response(estado)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            for nombre, valor in (cabeceras or {}).items():
+                self.send_header(nombre, valor)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Manejador)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servicio HTTP de consultas de KPIs")
+    parser.add_argument('--host', default=CONSULTAS_HOST)
+    parser.add_argument('--port', type=int, default=CONSULTAS_PORT)
+    args = parser.parse_args()
+
+    servidor = crear_servidor(ServicioKPIs(), args.host, args.port)
+    print(f"Servicio de KPIs en http://{args.host}:{args.port}/kpis (Ctrl+C para terminar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
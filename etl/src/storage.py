@@ -0,0 +1,225 @@
+"""
+Capa de almacenamiento entre etapas
+Las etapas leen y escriben tablas por nombre dentro de RAW_DIR, PROCESSED_DIR
+o ANALYTICS_DIR; el formato lo decide STORAGE_FORMAT:
+  - parquet: columnar, tipado, comprimido (STORAGE_COMPRESSION), con proyección de columnas
+  - csv: el formato original
+Con EXPORT_CSV, cada tabla escrita en parquet deja además una copia .csv (Power BI)
+SumideroAsincrono permite escribir en segundo plano mientras la siguiente etapa
+trabaja con los DataFrames en memoria
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from config import STORAGE_FORMAT, STORAGE_COMPRESSION, EXPORT_CSV, STORAGE_SINK_WORKERS
+from src import metricas
+
+EXTENSIONES = {'parquet': '.parquet', 'csv': '.csv'}
+
+
+def ruta_tabla(directorio: Path, nombre: str, formato: str = STORAGE_FORMAT) -> Path:
+    return Path(directorio) / f"{nombre}{EXTENSIONES[formato]}"
+
+
+def existe_tabla(directorio: Path, nombre: str) -> bool:
+    return ruta_tabla(directorio, nombre).exists()
+
+
+def listar_tablas(directorio: Path, prefijo: str = '') -> list[str]:
+    """Nombres de las tablas del directorio (sin extensión); los que empiezan por '_' son internos"""
+    extension = EXTENSIONES[STORAGE_FORMAT]
+    return sorted(p.stem for p in Path(directorio).glob(f"{prefijo}*{extension}")
+                  if not p.stem.startswith('_'))
+
+
+def leer_tabla(directorio: Path, nombre: str, columnas: list[str] | None = None,
+               filtro: dict[str, list] | None = None) -> pd.DataFrame:
+    """
+    Lee una tabla completa (o solo `columnas`)
+    Con `filtro` ({columna: valores}) solo las filas cuyos valores están en la
+    lista; en parquet el filtro se aplica al leer (se saltan los row groups que no coinciden)
+    """
+    ruta = ruta_tabla(directorio, nombre)
+    if STORAGE_FORMAT == 'parquet':
+        filtros = [(columna, 'in', list(valores)) for columna, valores in (filtro or {}).items()] or None
+        df = pd.read_parquet(ruta, columns=columnas, filters=filtros)
+    else:
+        df = pd.read_csv(ruta, usecols=columnas)
+        for columna, valores in (filtro or {}).items():
+            df = df[df[columna].isin(valores)]
+    metricas.contar(filas_entrada=len(df), bytes_leidos=ruta.stat().st_size)
+    return df
+
+
+def valores_distintos(directorio: Path, nombre: str, columna: str) -> list:
+    """Valores distintos de una columna, ordenados (lee solo esa columna)"""
+    ruta = ruta_tabla(directorio, nombre)
+    if STORAGE_FORMAT == 'parquet':
+        serie = pd.read_parquet(ruta, columns=[columna])[columna]
+    else:
+        serie = pd.read_csv(ruta, usecols=[columna])[columna]
+    return sorted(serie.dropna().unique())
+
+
+def iterar_tabla(directorio: Path, nombre: str, filas: int = 100_000,
+                 columnas: list[str] | None = None):
+    """Recorre una tabla por bloques de `filas` sin cargarla completa"""
+    ruta = ruta_tabla(directorio, nombre)
+    metricas.contar(bytes_leidos=ruta.stat().st_size)
+    if STORAGE_FORMAT == 'parquet':
+        import pyarrow.parquet as pq
+        bloques = (batch.to_pandas() for batch in
+                   pq.ParquetFile(ruta).iter_batches(batch_size=filas, columns=columnas))
+    else:
+        bloques = pd.read_csv(ruta, chunksize=filas, usecols=columnas)
+    for bloque in bloques:
+        metricas.contar(filas_entrada=len(bloque))
+        yield bloque
+
+
+def escribir_tabla(df: pd.DataFrame, directorio: Path, nombre: str) -> Path:
+    """Escribe una tabla completa de forma atómica"""
+    with EscritorTabla(directorio, nombre) as escritor:
+        escritor.escribir(df)
+    return escritor.ruta
+
+
+class EscritorTabla:
+    """
+    Escritura por bloques: cada `escribir(chunk)` se agrega al archivo
+    El archivo final solo aparece (os.replace) si el bloque `with` termina sin errores
+    """
+
+    def __init__(self, directorio: Path, nombre: str, columnas: list[str] | None = None):
+        self.directorio = Path(directorio)
+        self.nombre = nombre
+        self.columnas = columnas
+        self.ruta = ruta_tabla(directorio, nombre)
+        self.filas = 0
+        self._rutas = [self.ruta]
+        if STORAGE_FORMAT != 'csv' and EXPORT_CSV:
+            self._rutas.append(ruta_tabla(directorio, nombre, 'csv'))
+        self._tmps = [r.with_name(f"{r.name}.tmp") for r in self._rutas]
+        self._csv = None
+        self._parquet = None
+        self._schema = None
+
+    def __enter__(self):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def escribir(self, chunk: pd.DataFrame):
+        if STORAGE_FORMAT == 'parquet':
+            self._escribir_parquet(chunk)
+        if STORAGE_FORMAT == 'csv' or EXPORT_CSV:
+            if self._csv is None:
+                self._csv = open(self._tmps[-1], 'w', newline='')
+            chunk.to_csv(self._csv, index=False, header=(self.filas == 0))
+        self.filas += len(chunk)
+
+    def _escribir_parquet(self, chunk: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if self._parquet is None:
+            tabla = pa.Table.from_pandas(chunk, preserve_index=False)
+            self._schema = tabla.schema
+            self._parquet = pq.ParquetWriter(self._tmps[0], self._schema, compression=STORAGE_COMPRESSION)
+        else:
+            tabla = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+        self._parquet.write_table(tabla)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.filas == 0 and exc_type is None:
+            # Tabla vacía: se escribe igual para que tenga columnas
+            self.escribir(pd.DataFrame(columns=self.columnas or []))
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._csv is not None:
+            self._csv.close()
+
+        if exc_type is not None:
+            for tmp in self._tmps:
+                tmp.unlink(missing_ok=True)
+            return False
+        metricas.contar(filas_salida=self.filas, bytes_escritos=sum(tmp.stat().st_size for tmp in self._tmps))
+        for tmp, ruta in zip(self._tmps, self._rutas):
+            os.replace(tmp, ruta)
+        return False
+
+
+class SumideroAsincrono:
+    """
+    Persistencia en segundo plano: `escribir` encola la tabla y vuelve enseguida
+    Los DataFrames encolados no se deben modificar después de entregarlos
+    Al salir del bloque `with` (o con `esperar`) se esperan todas las escrituras
+    y se relanza el primer error
+    """
+
+    def __init__(self, workers: int = STORAGE_SINK_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sumidero')
+        self._lock = threading.Lock()
+        self._futuros = []
+
+    def escribir(self, df: pd.DataFrame, directorio: Path, nombre: str,
+                 al_terminar: Callable[[Path], None] | None = None):
+        def tarea():
+            ruta = escribir_tabla(df, directorio, nombre)
+            if al_terminar is not None:
+                al_terminar(ruta)
+            return ruta
+        with self._lock:
+            self._futuros.append(self._pool.submit(tarea))
+
+    def esperar(self):
+        with self._lock:
+            futuros, self._futuros = self._futuros, []
+        errores = [f.exception() for f in futuros if f.exception() is not None]
+        if errores:
+            raise errores[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.esperar()
+        finally:
+            self._pool.shutdown(wait=True)
+        return False
+
+
+def hashes_particiones(df: pd.DataFrame, claves: list[str]) -> dict[str, str]:
+    """
+    Hash del contenido de cada partición: por año si `year` está en la clave,
+    o una sola partición '*' para toda la tabla
+    Se ordena por la clave para que el hash no dependa del orden de las filas
+    """
+    cabecera = ','.join(map(str, df.columns)).encode()
+    filas = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    orden = (['year'] if 'year' in claves else []) + [c for c in claves if c != 'year']
+    if orden:
+        # Se ordenan solo las columnas de la clave y se permutan los hashes de fila
+        posiciones = df[orden].reset_index(drop=True).sort_values(orden, kind='stable').index.to_numpy()
+        filas = filas[posiciones]
+    if 'year' in claves:
+        years, inicios = np.unique(df['year'].to_numpy()[posiciones], return_index=True)
+        limites = list(inicios[1:]) + [len(df)]
+        return {str(y): hashlib.sha256(cabecera + filas[a:b].tobytes()).hexdigest()
+                for y, a, b in zip(years, inicios, limites)}
+    return {'*': hashlib.sha256(cabecera + filas.tobytes()).hexdigest()}
+
+
+def guardar(df: pd.DataFrame, directorio: Path, nombre: str,
+            sumidero: SumideroAsincrono | None = None) -> Path:
+    """Escribe ya, o lo encola en `sumidero` si se usa el modo en memoria"""
+    if sumidero is not None:
+        sumidero.escribir(df, directorio, nombre)
+        return ruta_tabla(directorio, nombre)
+    return escribir_tabla(df, directorio, nombre)
@@ -3,65 +3,119 @@ PASO 2: TRANSFORMACIÓN Y LIMPIEZA
 Lee datos raw, limpia y crea dataset unificado
 """
 import pandas as pd
-from config import RAW_DIR, PROCESSED_DIR, COUNTRIES_MAP
+from config import RAW_DIR, PROCESSED_DIR, COUNTRIES_MAP, SHARD_WORKERS
+from src import esquema, fragmentos, metricas
+from src.storage import SumideroAsincrono, guardar, leer_tabla, listar_tablas, valores_distintos
 
-def limpiar_datos():
-    """Lee y limpia todos los CSVs del directorio raw"""
+# Clave de cada fila del dataset unificado
+CLAVES = ['year', 'country_code', 'area', 'sex']
+
+def indexar_indicador(df: pd.DataFrame, indicator: str, informar: bool = True) -> pd.Series:
+    """
+    Deja un indicador como Serie indexada por CLAVES
+    Los duplicados de clave se resuelven aquí (se conserva el primero), antes del join
+    """
+    duplicados = df.duplicated(subset=CLAVES)
+    n_duplicados = int(duplicados.sum())
+    if n_duplicados:
+        df = df[~duplicados]
+    if informar:
+        print(f"  {indicator}: {len(df)} filas, {n_duplicados} duplicados eliminados")
+    return df.set_index(CLAVES)['value'].rename(indicator)
+
+def unir_indicadores(indicadores: list[pd.Series]) -> pd.DataFrame:
+    """Alinea todos los indicadores en una sola pasada (concat sobre el índice)"""
+    df_unified = pd.concat(indicadores, axis=1, join='outer')
+    df_unified = df_unified.dropna()
+    return df_unified.sort_index().reset_index()
+
+def unir_datos(datos: dict[str, pd.DataFrame], informar: bool = True) -> pd.DataFrame:
+    """Indexa y une los indicadores de `datos` (todos los países o un fragmento)"""
+    indicadores = []
+    for nombre, df in sorted(datos.items()):
+        with metricas.span('transform:indexar', indicador=nombre):
+            metricas.contar(filas_entrada=len(df))
+            indicadores.append(indexar_indicador(esquema.aplicar(df, nombre), nombre, informar))
+    with metricas.span('transform:unir', indicadores=len(indicadores)):
+        df_unified = unir_indicadores(indicadores)
+        metricas.contar(filas_salida=len(df_unified))
+    return df_unified
+
+def unir_fragmento(paises: list[str], tablas: list[str] | None = None,
+                   datos: dict[str, pd.DataFrame] | None = None) -> pd.DataFrame:
+    """
+    Tarea del pool: une los indicadores de un fragmento de países, leyendo de
+    raw solo sus filas (o tomándolas de `datos`, en el modo en memoria)
+    """
+    if datos is None:
+        filtro = {'country_code': paises}
+        datos = {nombre: leer_tabla(RAW_DIR, nombre, columnas=CLAVES + ['value'], filtro=filtro)
+                 for nombre in tablas}
+    return unir_datos(datos, informar=False)
+
+def unir_fragmentado(datos: dict[str, pd.DataFrame] | None, tablas: list[str],
+                     workers: int = SHARD_WORKERS) -> pd.DataFrame:
+    """
+    Une los indicadores por fragmentos de países en el pool de procesos
+    El join y la deduplicación son por clave, y la clave incluye el país: el
+    resultado es el mismo que sin fragmentar una vez concatenado y reordenado
+    """
+    if datos is None:
+        paises = sorted({p for nombre in tablas for p in valores_distintos(RAW_DIR, nombre, 'country_code')})
+    else:
+        paises = sorted({p for df in datos.values() for p in df['country_code'].dropna().unique()})
+    partes = fragmentos.repartir(paises, workers)
+    if len(partes) < 2:
+        return unir_datos(datos if datos is not None else
+                          {nombre: leer_tabla(RAW_DIR, nombre, columnas=CLAVES + ['value']) for nombre in tablas})
+    if datos is None:
+        argumentos = [(p, tablas) for p in partes]
+    else:
+        argumentos = [(p, None, {nombre: df[df['country_code'].isin(p)] for nombre, df in datos.items()})
+                      for p in partes]
+    print(f"  {len(paises)} países en {len(partes)} fragmentos ({workers} procesos)")
+    unidos = fragmentos.ejecutar(unir_fragmento, argumentos, 'transform', workers)
+    with metricas.span('transform:reducir', fragmentos=len(unidos)):
+        # Las categorías difieren entre fragmentos: se vuelven a tipar antes de ordenar
+        df_unified = esquema.aplicar(pd.concat(unidos, ignore_index=True))
+        df_unified = df_unified.sort_values(CLAVES, kind='stable', ignore_index=True)
+    return df_unified
+
+def limpiar_datos(datos: dict[str, pd.DataFrame] | None = None,
+                  sumidero: SumideroAsincrono | None = None):
+    """
+    Lee y limpia todas las tablas del directorio raw
+    Con `datos` (indicador -> DataFrame de la extracción) no se lee nada de disco
+    y, si hay `sumidero`, el resultado se guarda en segundo plano
+    """
     print("="*60)
     print("PASO 2: TRANSFORMACIÓN Y LIMPIEZA")
     print("="*60)
     
-    archivos = list(RAW_DIR.glob('*.csv'))
-    
-    if not archivos:
-        raise FileNotFoundError("No hay archivos CSV en data/raw/. Ejecuta 1_extract.py primero.")
-    
-    df_unified = pd.DataFrame()
-    for archivo in archivos:
-        df = pd.read_csv(archivo)
-        indicator = archivo.stem
-    
-        df.rename(columns={'value': indicator}, inplace=True)
-        if df_unified.empty:
-            df_unified = df
-        else:
-            df_unified = df_unified.merge(
-                df, 
-                on=['year', 'country_code', 'area', 'sex'],
-                how='outer'
-            )
-    
-    df_unified = df_unified.dropna()
-    # if len(dataframes) == 1:
-    #     # Si solo hay un archivo (IADB completo)
-    #     df_unified = list(dataframes.values())[0]
-    # else:
-    #     # Si hay múltiples archivos (datasets separados)
-    #     # Hacer merge por country_code y year
-    #     df_unified = None
-    #     for nombre, df in dataframes.items():
-    #         if df_unified is None:
-    #             df_unified = df
-    #         else:
-    #             # df_unified = df_unified.merge(df, on=['country_code', 'year'], how='outer')
-    #             df_unified = df_unified.merge(df, on=['country_code', 'year'], how='outer')
+    tablas = sorted(datos) if datos is not None else listar_tablas(RAW_DIR)
+    if not tablas:
+        raise FileNotFoundError("No hay archivos en data/raw/. Ejecuta 1_extract.py primero.")
     
-    # Eliminar duplicados
-    antes = len(df_unified)
-    df_unified = df_unified.drop_duplicates(subset=['country_code', 'year', 'area', 'sex'])
-    # print(f"  Duplicados eliminados: {antes - len(df_unified)}")
+    print("\nIndexando indicadores...")
+    if SHARD_WORKERS > 0:
+        df_unified = unir_fragmentado(datos, tablas)
+    else:
+        if datos is None:
+            datos = {nombre: leer_tabla(RAW_DIR, nombre, columnas=CLAVES + ['value']) for nombre in tablas}
+        df_unified = unir_datos(datos)
+    del datos
+    print(f"  ✓ Dataset unificado: {len(df_unified)} filas, {len(df_unified.columns)} columnas")
     
     # Agregar nombre del país
     if 'country_code' in df_unified.columns:
         df_unified['country_name'] = df_unified['country_code'].map(COUNTRIES_MAP)
         print(f"  ✓ Nombres de países agregados")
     
-    # Ordenar
-    # df_unified = df_unified.sort_values(['country_code', 'year']).reset_index(drop=True)
+    # Dimensiones categóricas (el concat de índices puede dejarlas como texto), year int16
+    df_unified = esquema.aplicar(df_unified)
     
     # Guardar
-    output_path = PROCESSED_DIR / 'unified_data.csv'
-    df_unified.to_csv(output_path, index=False)
+    output_path = guardar(df_unified, PROCESSED_DIR, 'unified_data', sumidero)
     
     print(f"Dataset limpio guardado: {output_path}")
     return df_unified
@@ -20,28 +20,21 @@ from kpi_pais_año
 where area = 'Total' and sex = 'Total';
 
 --
--- 3. Asistencia vs rendimiento estudiantil
+-- Las consultas 3 a 6 leen de vistas materializadas que crea y refresca la
+-- carga (etl/src/load/vistas.py). mv_notas tiene una fila por
+-- (country_code, year, area, sex) con el promedio PISA (grades) y los indicadores
 --
-drop view grades;
-create view grades as
-select
-    dtrunc(("meanscoreinreading(pisa)"
-     + "meanscoreinmathematics(pisa)"
-     + "meanscoreinscience(pisa)") / 3) as grades,
-    country_code
-    country_code
-from kpi_pais_año;
 
+--
+-- 3. Asistencia vs rendimiento estudiantil
+--
 select
     country_name,
-    avg(p."grossattendancerateprimaryeducation") as "Average Primary Attendance",
-    avg(p."grossattendanceratesecondaryeducation") as "Average Secondary Attendance",
-    avg(p."grossattendanceratetertiaryeducation") as "Average Tertiary Attendance",
-    avg(g.grades) as "Average grades"
-from grades as g inner join kpi_comparacion_regional as p
-    on g.country_code = p.country_code
-where p.area = 'Total' and p.sex = 'Total'
-group by country_name
+    avg_primary_attendance as "Average Primary Attendance",
+    avg_secondary_attendance as "Average Secondary Attendance",
+    avg_tertiary_attendance as "Average Tertiary Attendance",
+    avg_grades as "Average grades"
+from mv_asistencia_notas;
 
 --
 -- 4. Pobreza vs. rendimiento estudiantil
@@ -49,35 +42,29 @@ group by country_name
 select
     percentageofthepopulationinpoverty * 100 as poverty_rate,
     grades
-from grades as g inner join kpi_comparacion_regional as r
-    on g.country_code = r.country_code
-order by poverty_rate;
+from mv_notas
+order by percentageofthepopulationinpoverty;
 
 select
     country_name,
-    coalesce(corr(percentageofthepopulationinpoverty, grades), 0) as poverty_rate
-from grades as g inner join kpi_comparacion_regional as r
-    on g.country_code = r.country_code
-group by country_name;
+    corr_poverty_grades as poverty_rate
+from mv_pobreza_notas;
 
 --
 -- 5. Internet vs notas
 --
 select
     country_name,
-    corr(grades, percentagewithaccesstoschoolswithinternet) as correlation_internet_grades
-from grades as g inner join kpi_comparacion_regional as r
-    on g.country_code = r.country_code
-group by country_name;
+    corr_internet_grades as correlation_internet_grades
+from mv_internet_notas;
 
 --
 -- 6. Pobreza y asistencia
 --
 select
-    r.country_name,
-    avg(r."grossattendancerateprimaryeducation") as "Average Primary Attendance",
-    avg(r."grossattendanceratesecondaryeducation") as "Average Secondary Attendance",
-    avg(r."grossattendanceratetertiaryeducation") as "Average Tertiary Attendance",
-    avg(percentageofthepopulationinpoverty) * 100 || '%' as "Average Poverty Rate"
-from kpi_comparacion_regional as r
-group by country_name;
\ No newline at end of file
+    country_name,
+    avg_primary_attendance as "Average Primary Attendance",
+    avg_secondary_attendance as "Average Secondary Attendance",
+    avg_tertiary_attendance as "Average Tertiary Attendance",
+    avg_poverty_rate * 100 || '%' as "Average Poverty Rate"
+from mv_pobreza_asistencia;